@@ -0,0 +1,147 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from alarm_patterns import DEFAULT_PATTERN
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class AlarmController:
+    # Every gunicorn worker (and the desktop app) builds one of these. The first to take the
+    # lock owns the mixer and serves a Unix socket; the others forward play/stop/status to it.
+    def __init__(self, socket_path="data/alarm.sock", lock_file="data/alarm.lock", timeout=2.0):
+        self.socket_path = socket_path
+        self.lock_file = lock_file
+        self.timeout = timeout
+        self.alarm_system = None
+        self.owner_handle = None
+        self.server = None
+        self.lock = threading.Lock()
+        directory = os.path.dirname(socket_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._acquire_owner()
+
+    @property
+    def is_owner(self):
+        return self.alarm_system is not None
+
+    def _acquire_owner(self):
+        with self.lock:
+            if self.alarm_system is not None:
+                return True
+            if fcntl is None or not hasattr(socket, 'AF_UNIX'):
+                return self._become_owner()
+            handle = open(self.lock_file, 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            self.owner_handle = handle
+            return self._become_owner(serve=True)
+
+    def _become_owner(self, serve=False):
+        from alarm_system import AlarmSystem
+
+        self.alarm_system = AlarmSystem()
+        if serve:
+            # A socket left behind by a crashed owner is safe to remove: we hold the lock now
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, self._handler())
+            self.server.daemon_threads = True
+            thread = threading.Thread(target=self.server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        return True
+
+    def _handler(self):
+        controller = self
+
+        class CommandHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    command = json.loads(self.rfile.readline())
+                    result = controller._execute(command)
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+                self.wfile.write(json.dumps(result).encode() + b'\n')
+
+        return CommandHandler
+
+    def _execute(self, command):
+        action = command.get('action')
+        if action == 'play':
+            self.alarm_system.play_alarm(command.get('duration', 10), command.get('pattern', DEFAULT_PATTERN))
+        elif action == 'theft':
+            self.alarm_system.trigger_theft_alarm(command.get('pattern', DEFAULT_PATTERN))
+        elif action == 'stop':
+            self.alarm_system.stop_alarm()
+        elif action != 'status':
+            raise ValueError(f"Unknown alarm command: {action}")
+        return dict(self.alarm_system.status(), success=True, owner_pid=os.getpid())
+
+    def _send(self, command):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(self.timeout)
+            client.connect(self.socket_path)
+            client.sendall(json.dumps(command).encode() + b'\n')
+            with client.makefile('rb') as reader:
+                return json.loads(reader.readline())
+
+    def command(self, action, **params):
+        command = dict(params, action=action)
+        if not self.is_owner:
+            try:
+                result = self._send(command)
+            except (OSError, ValueError):
+                # The owner exited; whoever gets the lock next takes over the audio device
+                if not self._acquire_owner():
+                    try:
+                        result = self._send(command)
+                    except (OSError, ValueError) as e:
+                        result = {'success': False, 'error': f"Alarm owner not reachable: {e}"}
+                else:
+                    result = None
+            if result is not None:
+                if not result.get('success', True):
+                    raise ValueError(result.get('error', 'Alarm command failed'))
+                return result
+        return self._execute(command)
+
+    def play_alarm(self, duration=10, pattern=DEFAULT_PATTERN):
+        return self.command('play', duration=duration, pattern=pattern)
+
+    def stop_alarm(self):
+        return self.command('stop')
+
+    def status(self):
+        return self.command('status')
+
+    @property
+    def is_playing(self):
+        return self.status()['playing']
+
+    def test_alarm(self, duration=3, pattern=DEFAULT_PATTERN):
+        return self.play_alarm(duration, pattern)
+
+    def trigger_theft_alarm(self, pattern=DEFAULT_PATTERN):
+        return self.command('theft', pattern=pattern)
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        if self.alarm_system is not None:
+            self.alarm_system.stop_alarm()
+        if self.owner_handle is not None:
+            self.owner_handle.close()
+            self.owner_handle = None
@@ -0,0 +1,82 @@
+from functools import lru_cache
+import numpy as np
+
+def _tone(frequency, seconds, sample_rate):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return np.sin(2 * np.pi * frequency * t)
+
+def _sweep(frequencies, sample_rate):
+    # Integrating the instantaneous frequency keeps the phase continuous across the sweep
+    phase = 2 * np.pi * np.cumsum(frequencies) / sample_rate
+    return np.sin(phase)
+
+def tone(sample_rate, frequency=1000, on=1.0, off=0.2):
+    return np.concatenate([_tone(frequency, on, sample_rate), np.zeros(int(sample_rate * off))])
+
+def siren(sample_rate, low=600, high=1400, period=2.0):
+    t = np.arange(int(sample_rate * period)) / sample_rate
+    frequencies = low + (high - low) * 0.5 * (1 - np.cos(2 * np.pi * t / period))
+    return _sweep(frequencies, sample_rate)
+
+def pulse(sample_rate, frequency=2000, on=0.1, off=0.1, count=4, rest=0.4):
+    beep = np.concatenate([_tone(frequency, on, sample_rate), np.zeros(int(sample_rate * off))])
+    return np.concatenate([np.tile(beep, count), np.zeros(int(sample_rate * rest))])
+
+def two_tone(sample_rate, high=960, low=770, step=0.5):
+    return np.concatenate([_tone(high, step, sample_rate), _tone(low, step, sample_rate)])
+
+def chirp(sample_rate, start=500, end=3000, sweep=0.3, off=0.2):
+    t = np.arange(int(sample_rate * sweep)) / sample_rate
+    frequencies = start * (end / start) ** (t / sweep)
+    return np.concatenate([_sweep(frequencies, sample_rate), np.zeros(int(sample_rate * off))])
+
+PATTERNS = {
+    'tone': tone,
+    'siren': siren,
+    'pulse': pulse,
+    'two_tone': two_tone,
+    'chirp': chirp
+}
+
+DEFAULT_PATTERN = 'tone'
+
+@lru_cache(maxsize=32)
+def _render(name, sample_rate, channels, params):
+    wave_data = PATTERNS[name](sample_rate, **dict(params))
+    # A few milliseconds of fade at each end avoids a click where the loop wraps around
+    fade = min(len(wave_data) // 2, int(sample_rate * 0.005))
+    if fade:
+        ramp = np.linspace(0, 1, fade)
+        wave_data[:fade] *= ramp
+        wave_data[-fade:] *= ramp[::-1]
+    samples = (wave_data * 32767).astype(np.int16)
+    if channels > 1:
+        samples = np.repeat(samples[:, np.newaxis], channels, axis=1)
+    samples.setflags(write=False)
+    return samples
+
+def synthesize(name, sample_rate=44100, channels=1, **params):
+    if name not in PATTERNS:
+        raise ValueError(f"Unknown alarm pattern: {name}")
+    return _render(name, sample_rate, channels, tuple(sorted(params.items())))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark alarm pattern synthesis")
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--channels', type=int, default=2)
+    args = parser.parse_args()
+
+    for name in PATTERNS:
+        _render.cache_clear()
+        start = time.perf_counter()
+        samples = synthesize(name, args.sample_rate, args.channels)
+        cold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        synthesize(name, args.sample_rate, args.channels)
+        cached_us = (time.perf_counter() - start) * 1000000
+        seconds = len(samples) / args.sample_rate
+        print(f"{name:<10} {seconds:5.2f}s loop {cold_ms:8.2f} ms cold {cached_us:8.1f} us cached")
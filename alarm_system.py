@@ -3,6 +3,7 @@ import os
 import threading
 import time
 from datetime import datetime
+from alarm_patterns import PATTERNS, DEFAULT_PATTERN, synthesize
 
 class AlarmSystem:
     def __init__(self):
@@ -13,77 +14,79 @@ class AlarmSystem:
             print("Warning: No audio device available. Alarm functionality will be disabled.")
             self.audio_available = False
         
-        self.is_playing = False
-        self.alarm_thread = None
+        self.sounds = {}
+        self.alarm_sound = None
+        self.channel = None
+        self.pattern = None
+        self.ends_at = None
+        self.lock = threading.Lock()
         
         if self.audio_available:
-            self.create_alarm_sound()
+            self.get_sound()
     
-    def create_alarm_sound(self):
-        self.alarm_file = "data/alarm.wav"
-        if not os.path.exists("data"):
-            os.makedirs("data")
-        
-        if not os.path.exists(self.alarm_file):
-            duration = 1.0
-            frequency = 1000
-            sample_rate = 22050
-            
-            import numpy as np
-            import wave
-            
-            t = np.linspace(0, duration, int(sample_rate * duration))
-            wave_data = np.sin(2 * np.pi * frequency * t)
-            wave_data = (wave_data * 32767).astype(np.int16)
-            
-            with wave.open(self.alarm_file, 'w') as wav_file:
-                wav_file.setnchannels(1)
-                wav_file.setsampwidth(2)
-                wav_file.setframerate(sample_rate)
-                wav_file.writeframes(wave_data.tobytes())
+    def get_sound(self, pattern=DEFAULT_PATTERN):
+        # One loop of the pattern kept in memory; the mixer repeats it natively without a Python thread
+        if pattern not in self.sounds:
+            sample_rate, _, channels = pygame.mixer.get_init()
+            sound = pygame.sndarray.make_sound(synthesize(pattern, sample_rate, channels))
+            sound.set_volume(1.0)
+            self.sounds[pattern] = sound
+        return self.sounds[pattern]
+    
+    @property
+    def is_playing(self):
+        return self.channel is not None and self.channel.get_busy()
     
-    def play_alarm(self, duration=10):
+    def play_alarm(self, duration=10, pattern=DEFAULT_PATTERN):
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown alarm pattern: {pattern}")
+        try:
+            maxtime = int(duration * 1000)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Invalid alarm duration: {duration!r}")
+        if maxtime < 1:
+            # The mixer reads maxtime <= 0 as "no limit", which would loop the alarm until someone stops it
+            raise ValueError("Alarm duration must be at least 1 ms")
         if not self.audio_available:
             print("Warning: Cannot play alarm - no audio device available")
             return
         
-        if self.is_playing:
-            return
-        
-        self.is_playing = True
-        self.alarm_thread = threading.Thread(target=self._alarm_loop, args=(duration,))
-        self.alarm_thread.daemon = True
-        self.alarm_thread.start()
-    
-    def _alarm_loop(self, duration):
-        try:
-            pygame.mixer.music.load(self.alarm_file)
-            pygame.mixer.music.set_volume(1.0)
-            
-            end_time = time.time() + duration
-            while time.time() < end_time and self.is_playing:
-                pygame.mixer.music.play()
-                time.sleep(1.2)
-        except Exception as e:
-            print(f"Alarm error: {e}")
-        finally:
-            self.is_playing = False
+        with self.lock:
+            if self.is_playing:
+                return
+            try:
+                self.alarm_sound = self.get_sound(pattern)
+                # maxtime makes the mixer stop the loop itself when the duration runs out
+                self.channel = self.alarm_sound.play(loops=-1, maxtime=maxtime)
+                self.pattern = pattern
+                self.ends_at = time.time() + duration
+            except Exception as e:
+                print(f"Alarm error: {e}")
     
     def stop_alarm(self):
-        self.is_playing = False
-        try:
-            pygame.mixer.music.stop()
-        except:
-            pass
+        with self.lock:
+            if self.alarm_sound is not None:
+                self.alarm_sound.stop()
+            self.channel = None
+    
+    def status(self):
+        playing = self.is_playing
+        return {
+            'playing': playing,
+            'pattern': self.pattern if playing else None,
+            'remaining': round(max(0, self.ends_at - time.time()), 1) if playing else 0,
+            'audio_available': self.audio_available
+        }
     
-    def test_alarm(self, duration=3):
-        self.play_alarm(duration)
+    def test_alarm(self, duration=3, pattern=DEFAULT_PATTERN):
+        self.play_alarm(duration, pattern)
     
-    def trigger_theft_alarm(self):
-        self.play_alarm(30)
+    def trigger_theft_alarm(self, pattern=DEFAULT_PATTERN):
+        self.play_alarm(30, pattern)
         self.log_alarm_event("Theft alarm triggered")
     
     def log_alarm_event(self, message):
         log_file = "data/alarm_log.txt"
+        os.makedirs("data", exist_ok=True)
         with open(log_file, 'a') as f:
             f.write(f"{datetime.now().isoformat()} - {message}\n")
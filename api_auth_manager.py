@@ -5,12 +5,19 @@ from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 from Crypto.Protocol.KDF import PBKDF2
 import base64
+import threading
+
+# PBKDF2 is deliberately slow; derive each key once per process rather than on every request
+_server_key_cache = {}
+_server_key_lock = threading.Lock()
 
 class APIAuthManager:
     def __init__(self):
         self.data_dir = "data"
         self.api_auth_file = os.path.join(self.data_dir, "api_auth.enc")
         self.server_secret_file = os.path.join(self.data_dir, ".server_secret")
+        self.server_secret = None
+        self.device_manager = None
         self.ensure_data_directory()
     
     def ensure_data_directory(self):
@@ -18,15 +25,18 @@ class APIAuthManager:
             os.makedirs(self.data_dir)
     
     def get_or_create_server_secret(self):
+        # Read once per instance; the secret never changes while the process runs
+        if self.server_secret is not None:
+            return self.server_secret
         if os.path.exists(self.server_secret_file):
             with open(self.server_secret_file, 'r') as f:
-                return f.read().strip()
+                self.server_secret = f.read().strip()
         else:
             import secrets
-            server_secret = secrets.token_urlsafe(32)
+            self.server_secret = secrets.token_urlsafe(32)
             with open(self.server_secret_file, 'w') as f:
-                f.write(server_secret)
-            return server_secret
+                f.write(self.server_secret)
+        return self.server_secret
     
     def get_server_key(self):
         session_secret = os.environ.get('SESSION_SECRET')
@@ -34,14 +44,18 @@ class APIAuthManager:
         if not session_secret:
             session_secret = self.get_or_create_server_secret()
         
-        from device_manager import DeviceManager
-        device_manager = DeviceManager()
-        device_id = device_manager.get_device_id()
+        if self.device_manager is None:
+            from device_manager import DeviceManager
+            self.device_manager = DeviceManager()
+        device_id = self.device_manager.get_device_id()
         
         key_material = f"{session_secret}:{device_id}"
-        salt = hashlib.sha256(device_id.encode()).digest()
-        
-        key = PBKDF2(key_material, salt, dkLen=32, count=50000)
+        with _server_key_lock:
+            key = _server_key_cache.get(key_material)
+            if key is None:
+                salt = hashlib.sha256(device_id.encode()).digest()
+                key = PBKDF2(key_material, salt, dkLen=32, count=50000)
+                _server_key_cache[key_material] = key
         return key
     
     def save_api_credentials(self, api_key, user_email, user_name):
@@ -93,6 +107,14 @@ class APIAuthManager:
             return False
         return api_data.get('api_key') == provided_key
     
+    def get_version(self):
+        # Changes whenever the credentials file is rewritten, in this process or any other
+        try:
+            stat = os.stat(self.api_auth_file)
+        except OSError:
+            return "0"
+        return f"{stat.st_mtime_ns:x}.{stat.st_size:x}"
+    
     def get_user_info(self):
         api_data = self.get_api_credentials()
         if not api_data:
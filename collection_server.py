@@ -0,0 +1,143 @@
+from flask import Flask, request, jsonify
+import hashlib
+import json
+import os
+import re
+import threading
+
+app = Flask(__name__)
+
+COLLECTION_DIR = os.environ.get('COLLECTION_DIR', "collected")
+COLLECTION_API_KEY = os.environ.get('COLLECTION_API_KEY', '')
+SAFE_ID = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+
+upload_lock = threading.Lock()
+
+def is_authorized():
+    return not COLLECTION_API_KEY or request.headers.get('X-API-Key') == COLLECTION_API_KEY
+
+def device_dir(device_id):
+    device_id = device_id if device_id and SAFE_ID.match(device_id) else 'unknown'
+    path = os.path.join(COLLECTION_DIR, device_id)
+    os.makedirs(os.path.join(path, "partial"), exist_ok=True)
+    os.makedirs(os.path.join(path, "evidence"), exist_ok=True)
+    return path
+
+def upload_paths(upload_id):
+    meta_file = os.path.join(COLLECTION_DIR, "uploads", f"{upload_id}.json")
+    if not os.path.exists(meta_file):
+        return None, None
+    with open(meta_file, 'r') as f:
+        meta = json.load(f)
+    base = device_dir(meta['device_id'])
+    return meta, {
+        'meta': meta_file,
+        'partial': os.path.join(base, "partial", upload_id),
+        'final': os.path.join(base, "evidence", meta['filename'])
+    }
+
+def received_bytes(paths):
+    if os.path.exists(paths['final']):
+        return os.path.getsize(paths['final'])
+    if os.path.exists(paths['partial']):
+        return os.path.getsize(paths['partial'])
+    return 0
+
+def finish_upload(meta, paths):
+    # A zero-byte upload never appends a chunk, so its partial file may not exist yet
+    open(paths['partial'], 'ab').close()
+    sha = hashlib.sha256()
+    with open(paths['partial'], 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    if sha.hexdigest() != meta['sha256']:
+        os.remove(paths['partial'])
+        return False
+    os.replace(paths['partial'], paths['final'])
+    return True
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    if not is_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json or {}
+    upload_id = data.get('upload_id', '')
+    if not SAFE_ID.match(upload_id) or not isinstance(data.get('size'), int):
+        return jsonify({'error': 'Invalid upload'}), 400
+
+    with upload_lock:
+        meta, paths = upload_paths(upload_id)
+        if meta is None:
+            os.makedirs(os.path.join(COLLECTION_DIR, "uploads"), exist_ok=True)
+            meta = {
+                'upload_id': upload_id,
+                'device_id': data.get('device_id') or 'unknown',
+                'kind': data.get('kind'),
+                'filename': os.path.basename(data.get('filename') or upload_id),
+                'size': data['size'],
+                'sha256': data.get('sha256', '')
+            }
+            with open(os.path.join(COLLECTION_DIR, "uploads", f"{upload_id}.json"), 'w') as f:
+                json.dump(meta, f)
+            meta, paths = upload_paths(upload_id)
+
+        offset = received_bytes(paths)
+        complete = os.path.exists(paths['final'])
+        if not complete and offset == meta['size']:
+            complete = finish_upload(meta, paths)
+            offset = received_bytes(paths)
+
+    return jsonify({'offset': offset, 'complete': complete, 'verified': complete})
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def append_chunk(upload_id):
+    if not is_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not SAFE_ID.match(upload_id):
+        return jsonify({'error': 'Invalid upload'}), 400
+
+    with upload_lock:
+        meta, paths = upload_paths(upload_id)
+        if meta is None:
+            return jsonify({'error': 'Unknown upload'}), 404
+
+        offset = received_bytes(paths)
+        if os.path.exists(paths['final']) or request.headers.get('Upload-Offset', type=int) != offset:
+            return jsonify({'error': 'Offset mismatch', 'offset': offset}), 409
+
+        chunk = request.get_data()
+        if offset + len(chunk) > meta['size']:
+            return jsonify({'error': 'Upload exceeds declared size', 'offset': offset}), 400
+        with open(paths['partial'], 'ab') as f:
+            f.write(chunk)
+        offset += len(chunk)
+
+        verified = False
+        if offset == meta['size']:
+            verified = finish_upload(meta, paths)
+            if not verified:
+                return jsonify({'error': 'Checksum mismatch', 'offset': 0}), 422
+
+    return jsonify({'offset': offset, 'complete': verified, 'verified': verified})
+
+@app.route('/events', methods=['POST'])
+def receive_event():
+    if not is_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json or {}
+    if not isinstance(data.get('event'), dict):
+        return jsonify({'error': 'Missing event'}), 400
+
+    with upload_lock:
+        with open(os.path.join(device_dir(data.get('device_id')), "events.jsonl"), 'a') as f:
+            f.write(json.dumps(data['event']) + '\n')
+
+    return jsonify({'success': True})
+
+if __name__ == '__main__':
+    port = int(os.environ.get('COLLECTION_PORT', 5050))
+    print(f"Evidence collection server storing uploads in {os.path.abspath(COLLECTION_DIR)}")
+    print(f"Listening on http://0.0.0.0:{port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -3,7 +3,7 @@ from tkinter import ttk, messagebox, scrolledtext
 import threading
 from location_tracker import LocationTracker
 from evidence_capture import EvidenceCapture
-from alarm_system import AlarmSystem
+from alarm_controller import AlarmController
 from event_logger import EventLogger
 from lock_manager import LockManager
 
@@ -15,7 +15,7 @@ class ControlPanel:
         
         self.location_tracker = LocationTracker()
         self.evidence_capture = EvidenceCapture()
-        self.alarm_system = AlarmSystem()
+        self.alarm_system = AlarmController()
         self.event_logger = EventLogger()
         self.lock_manager = LockManager()
         
@@ -214,6 +214,15 @@ Total Events Logged: {event_summary['total_events']}
         self.evidence_text.pack(pady=10)
         
         self.update_evidence_list()
+        
+        def reconcile():
+            result = self.evidence_capture.reconcile_evidence()
+            if result and (result['added'] or result['removed']):
+                self.root.after(0, self.update_evidence_list)
+        
+        thread = threading.Thread(target=reconcile)
+        thread.daemon = True
+        thread.start()
     
     def capture_webcam(self):
         result = self.evidence_capture.capture_webcam_photo()
@@ -249,11 +258,12 @@ Total Events Logged: {event_summary['total_events']}
     
     def update_evidence_list(self):
         self.evidence_text.delete("1.0", tk.END)
-        files = self.evidence_capture.get_evidence_files()
+        files = self.evidence_capture.get_evidence_files(limit=20)
         
         if files:
-            self.evidence_text.insert(tk.END, f"Evidence Files ({len(files)}):\n\n")
-            for f in files[:20]:
+            total = self.evidence_capture.count_evidence_files()
+            self.evidence_text.insert(tk.END, f"Evidence Files ({total}):\n\n")
+            for f in files:
                 self.evidence_text.insert(tk.END, 
                     f"{f['filename']} - {f['size']/1024:.1f} KB - {f['modified'][:19]}\n")
         else:
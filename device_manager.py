@@ -2,9 +2,21 @@ import uuid
 import os
 import json
 import platform
+import threading
+import time
 import psutil
+from collections import namedtuple
 from datetime import datetime
 
+DeviceIdentity = namedtuple('DeviceIdentity', [
+    'device_id', 'hostname', 'system', 'release', 'processor', 'cpu_count', 'memory_total', 'registered_at'
+])
+
+# Shared by every DeviceManager in the process; the file is stat'ed at most once per interval
+IDENTITY_CHECK_INTERVAL = 5.0
+_identity_cache = {}
+_identity_lock = threading.Lock()
+
 class DeviceManager:
     def __init__(self):
         self.data_dir = "data"
@@ -35,21 +47,65 @@ class DeviceManager:
         
         return device_id
     
-    def get_device_id(self):
+    def _load_identity(self):
+        data = {}
         if os.path.exists(self.device_file):
             with open(self.device_file, 'r') as f:
                 data = json.load(f)
-                return data.get('device_id', 'Unknown')
-        return self.generate_device_id()
+        # platform.processor() shells out on Linux, so static host facts are gathered once per load
+        return DeviceIdentity(
+            device_id=data.get('device_id'),
+            hostname=platform.node(),
+            system=platform.system(),
+            release=platform.release(),
+            processor=platform.processor(),
+            cpu_count=psutil.cpu_count(),
+            memory_total=f"{psutil.virtual_memory().total / (1024**3):.2f} GB",
+            registered_at=data.get('registered_at')
+        )
     
-    def get_device_info(self):
+    def get_identity(self):
+        now = time.monotonic()
+        with _identity_lock:
+            cached = _identity_cache.get(self.device_file)
+            if cached and now < cached['checked_at'] + IDENTITY_CHECK_INTERVAL:
+                return cached['identity']
+            
+            try:
+                stat = os.stat(self.device_file)
+                signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            
+            if cached and cached['signature'] == signature:
+                cached['checked_at'] = now
+                return cached['identity']
+            
+            identity = self._load_identity()
+            _identity_cache[self.device_file] = {'identity': identity, 'signature': signature, 'checked_at': now}
+            return identity
+    
+    def get_device_id(self):
+        device_id = self.get_identity().device_id
+        if device_id:
+            return device_id
+        if os.path.exists(self.device_file):
+            return 'Unknown'
+        device_id = self.generate_device_id()
+        with _identity_lock:
+            _identity_cache.pop(self.device_file, None)
+        return device_id
+    
+    def get_device_info(self, sample=None):
+        # A telemetry sample, when given, supplies disk usage so no psutil call is made
+        identity = self.get_identity()
         info = {
-            'hostname': platform.node(),
-            'system': platform.system(),
-            'release': platform.release(),
-            'processor': platform.processor(),
-            'cpu_count': psutil.cpu_count(),
-            'memory_total': f"{psutil.virtual_memory().total / (1024**3):.2f} GB",
-            'disk_usage': f"{psutil.disk_usage('/').percent}%"
+            'hostname': identity.hostname,
+            'system': identity.system,
+            'release': identity.release,
+            'processor': identity.processor,
+            'cpu_count': identity.cpu_count,
+            'memory_total': identity.memory_total,
+            'disk_usage': f"{sample['disk_percent'] if sample else psutil.disk_usage('/').percent}%"
         }
         return info
@@ -0,0 +1,141 @@
+import json
+import os
+import cv2
+import numpy as np
+
+class EncodingPolicy:
+    EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+    def __init__(self, format='jpeg', quality=85, max_resolution=None, grayscale=False):
+        if format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported evidence format: {format}")
+        self.format = format
+        self.quality = quality
+        self.max_resolution = tuple(max_resolution) if max_resolution else None
+        self.grayscale = grayscale
+
+    @property
+    def ext(self):
+        return self.EXTENSIONS[self.format]
+
+    def encode_params(self):
+        if self.format == 'jpeg':
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        if self.format == 'webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        # PNG is lossless; quality selects zlib effort (higher is smaller but slower)
+        return [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, round(self.quality / 100 * 9)))]
+
+    def prepare(self, image):
+        if self.max_resolution:
+            max_width, max_height = self.max_resolution
+            height, width = image.shape[:2]
+            scale = min(max_width / width, max_height / height)
+            if scale < 1:
+                size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if self.grayscale and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def encode(self, image):
+        ok, encoded = cv2.imencode(self.ext, self.prepare(image), self.encode_params())
+        if not ok:
+            raise ValueError(f"{self.format.upper()} encoding failed")
+        return encoded.tobytes(), self.ext
+
+    def to_dict(self):
+        return {
+            'format': self.format,
+            'quality': self.quality,
+            'max_resolution': list(self.max_resolution) if self.max_resolution else None,
+            'grayscale': self.grayscale
+        }
+
+
+DEFAULT_POLICIES = {
+    'default': {
+        'webcam': EncodingPolicy('jpeg', 90),
+        'screenshot': EncodingPolicy('png', 30)
+    },
+    # Theft mode favours small files that upload quickly over a tethered or public connection
+    'theft': {
+        'webcam': EncodingPolicy('jpeg', 75, max_resolution=(1280, 720)),
+        'screenshot': EncodingPolicy('webp', 60, max_resolution=(1600, 900))
+    }
+}
+
+POLICY_FILE = "data/encoding_policies.json"
+
+def load_policies(policy_file=POLICY_FILE):
+    policies = {trigger: dict(kinds) for trigger, kinds in DEFAULT_POLICIES.items()}
+    if os.path.exists(policy_file):
+        try:
+            with open(policy_file, 'r') as f:
+                overrides = json.load(f)
+            for trigger, kinds in overrides.items():
+                for kind, settings in kinds.items():
+                    policies.setdefault(trigger, {})[kind] = EncodingPolicy(**settings)
+        except Exception as e:
+            print(f"Error loading encoding policies: {e}")
+    return policies
+
+def get_policy(policies, trigger, kind):
+    return policies.get(trigger, {}).get(kind) or policies['default'][kind]
+
+def to_bgr(pil_image):
+    return np.asarray(pil_image.convert('RGB'))[..., ::-1]
+
+
+def synthetic_screen(width=2560, height=1600, seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 240, dtype=np.uint8)
+    image[:40] = (60, 60, 60)
+    for _ in range(40):
+        x, y = rng.integers(0, width - 400), rng.integers(40, height - 200)
+        w, h = rng.integers(100, 400), rng.integers(20, 200)
+        image[y:y + h, x:x + w] = rng.integers(0, 256, 3, dtype=np.uint8)
+    for y in range(60, height, 24):
+        image[y:y + 2, 80:width // 2] = 30
+    return image
+
+def benchmark(image, policies, repeat=5):
+    import time
+
+    results = []
+    for name, policy in policies.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data, ext = policy.encode(image)
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append({
+            'policy': name,
+            'settings': policy.to_dict(),
+            'bytes': len(data),
+            'encode_ms': round(sorted(timings)[len(timings) // 2], 2)
+        })
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark evidence encoding policies (encode time and bytes per image)")
+    parser.add_argument('image', nargs='?', help="Image to encode (a synthetic 2560x1600 desktop if omitted)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image) if args.image else synthetic_screen()
+    candidates = {f"{trigger}/{kind}": policy
+                  for trigger, kinds in load_policies().items() for kind, policy in kinds.items()}
+    candidates.update({
+        'png/full': EncodingPolicy('png', 10),
+        'jpeg-85/full': EncodingPolicy('jpeg', 85),
+        'jpeg-60/1280': EncodingPolicy('jpeg', 60, max_resolution=(1280, 800)),
+        'webp-50/1280': EncodingPolicy('webp', 50, max_resolution=(1280, 800)),
+        'jpeg-60/1280/gray': EncodingPolicy('jpeg', 60, max_resolution=(1280, 800), grayscale=True)
+    })
+
+    for result in benchmark(image, candidates, args.repeat):
+        print(f"{result['policy']:<22} {result['bytes'] / 1024:>10.1f} KB {result['encode_ms']:>10.2f} ms")
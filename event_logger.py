@@ -1,16 +1,40 @@
 import json
 import os
+import tempfile
+import threading
 from datetime import datetime
 from location_tracker import LocationTracker
 from evidence_capture import EvidenceCapture
+from evidence_store import PRIORITY_PROTECTED
+from upload_queue import UploadQueue
+from face_analyzer import FaceAnalyzer, is_available as face_analysis_available
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PROTECTED_EVENT_TYPES = {'LOCK', 'WEB_LOCK', 'REMOTE_LOCK', 'ALARM_TRIGGERED', 'WEB_ALARM', 'REMOTE_ALARM'}
+FACE_UPLOAD_PRIORITY = 5
 
 class EventLogger:
     def __init__(self):
         self.log_dir = "data/logs"
         self.log_file = os.path.join(self.log_dir, "events.json")
+        self.events_lock = threading.Lock()
+        self.subscribers = []
+        self.file_signature = None
+        self.last_notified_id = None
         self.ensure_log_directory()
         self.location_tracker = LocationTracker()
         self.evidence_capture = EvidenceCapture()
+        self.upload_queue = UploadQueue(evidence_store=self.evidence_capture.store)
+        self.face_analyzer = None
+        if os.environ.get('FACE_ANALYSIS') == '1':
+            if not face_analysis_available():
+                print("Face analysis disabled: this OpenCV build has no Haar cascade support")
+            else:
+                self.face_analyzer = FaceAnalyzer(self.evidence_capture.store, on_faces=self.on_faces_detected)
     
     def ensure_log_directory(self):
         if not os.path.exists(self.log_dir):
@@ -26,28 +50,124 @@ class EventLogger:
         return []
     
     def save_events(self, events):
-        with open(self.log_file, 'w') as f:
-            json.dump(events, f, indent=2)
+        # Replaced atomically so readers in other processes never see a half-written log
+        fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(events, f, indent=2)
+            os.replace(tmp_path, self.log_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def _signature(self):
+        try:
+            stat = os.stat(self.log_file)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def _take_new_events(self, events):
+        # Called with events_lock held; returns events no subscriber has been told about yet
+        last_id = events[-1].get('event_id', 0) if events else 0
+        if self.last_notified_id is None:
+            new_events = []
+        else:
+            new_events = [event for event in events if event.get('event_id', 0) > self.last_notified_id]
+        self.last_notified_id = max(self.last_notified_id or 0, last_id)
+        self.file_signature = self._signature()
+        return new_events
+    
+    def refresh(self):
+        # Picks up events written by other processes (the desktop app, other server workers)
+        with self.events_lock:
+            if self._signature() == self.file_signature and self.last_notified_id is not None:
+                return []
+            new_events = self._take_new_events(self.load_events())
+        self.notify(new_events)
+        return new_events
+    
+    def get_last_event_id(self):
+        # A stat when nothing has changed; the log is only parsed again after a write
+        self.refresh()
+        return self.last_notified_id
+    
+    def subscribe(self, callback):
+        with self.events_lock:
+            if self.last_notified_id is None:
+                self._take_new_events(self.load_events())
+            self.subscribers.append(callback)
     
-    def log_event(self, event_type, description, include_location=False, include_evidence=False):
+    def unsubscribe(self, callback):
+        with self.events_lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+    
+    def notify(self, events):
+        with self.events_lock:
+            subscribers = list(self.subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Event subscriber error: {e}")
+    
+    def on_faces_detected(self, blob_id, faces):
+        store = self.evidence_capture.store
+        store.raise_priority(blob_id, PRIORITY_PROTECTED)
+        self.upload_queue.prioritize(store.get(blob_id), FACE_UPLOAD_PRIORITY)
+    
+    def log_event(self, event_type, description, include_location=False, include_evidence=False, evidence=None,
+                  location=None):
         event = {
-            'event_id': len(self.load_events()) + 1,
+            'event_id': None,
             'timestamp': datetime.now().isoformat(),
             'type': event_type,
             'description': description
         }
         
-        if include_location:
-            location = self.location_tracker.get_current_location()
+        if include_location or location is not None:
+            if location is None:
+                location = self.location_tracker.get_current_location()
             event['location'] = location
         
-        if include_evidence:
-            evidence = self.evidence_capture.capture_evidence_set()
+        protected = event_type in PROTECTED_EVENT_TYPES
+        if include_evidence or evidence:
+            if not evidence:
+                evidence = self.evidence_capture.capture_evidence_set('theft' if protected else 'default')
             event['evidence'] = evidence
         
-        events = self.load_events()
-        events.append(event)
-        self.save_events(events)
+        # Jobs and every server worker append to the same log: the read-modify-write is serialized across
+        # processes, and the id is assigned only once the slow work is done
+        with self.events_lock, open(self.log_file + ".lock", 'a') as writer_lock:
+            if fcntl is not None:
+                fcntl.flock(writer_lock, fcntl.LOCK_EX)
+            events = self.load_events()
+            event['event_id'] = len(events) + 1
+            if evidence:
+                blob_ids = self.evidence_capture.store.link_event(event['event_id'],
+                                                                  [evidence.get('webcam'), evidence.get('screenshot'),
+                                                                   evidence.get('clip')],
+                                                                  priority=PRIORITY_PROTECTED if protected else None)
+            else:
+                blob_ids = []
+            events.append(event)
+            self.save_events(events)
+            new_events = self._take_new_events(events)
+        self.notify(new_events)
+        
+        try:
+            self.upload_queue.enqueue_event(event)
+            for blob_id in blob_ids:
+                self.upload_queue.enqueue_evidence(self.evidence_capture.store.get(blob_id))
+        except Exception as e:
+            print(f"Upload queue error: {e}")
+        
+        if self.face_analyzer:
+            for blob_id in blob_ids:
+                self.face_analyzer.submit(self.evidence_capture.store.get(blob_id))
         
         return event
     
@@ -103,6 +223,8 @@ class EventLogger:
                         f.write(f"  Webcam Photo: {ev['webcam']}\n")
                     if ev.get('screenshot'):
                         f.write(f"  Screenshot: {ev['screenshot']}\n")
+                    if ev.get('clip'):
+                        f.write(f"  Video Clip: {ev['clip']}\n")
                 
                 f.write("\n" + "-" * 80 + "\n")
         
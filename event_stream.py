@@ -0,0 +1,131 @@
+import json
+import threading
+from collections import deque
+
+def format_sse(event_id, kind, data):
+    # Messages without an id are live-only; the browser keeps resuming from the last id it saw
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+class EventBroker:
+    def __init__(self, history=256, heartbeat=15.0, poll_interval=1.0):
+        self.history = deque(maxlen=history)
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.last_id = 0
+        self.dropped_id = 0
+        self.listeners = 0
+        self.closed = False
+        self.pollers = []
+        self.sources = []
+        self.thread = None
+
+    def publish(self, kind, data):
+        with self.condition:
+            # A per-process sequence; clients only ever see cursors built from add_source positions
+            self.last_id += 1
+            if len(self.history) == self.history.maxlen:
+                self.dropped_id = self.history[0][0]
+            self.history.append((self.last_id, kind, data))
+            self.condition.notify_all()
+            return self.last_id
+
+    def add_source(self, kind, position, current, replay):
+        # A durable kind: position(data) and current() read state that every server process shares, and
+        # replay(after) reloads what came after a position, so Last-Event-ID resumes on any worker
+        self.sources.append((kind, position, current, replay))
+
+    def add_poller(self, poller):
+        # Pollers pick up changes made by other processes; they only run while someone is listening
+        self.pollers.append(poller)
+
+    def _poll(self):
+        while True:
+            with self.condition:
+                if self.condition.wait_for(lambda: self.closed, self.poll_interval):
+                    return
+                if not self.listeners:
+                    continue
+            for poller in self.pollers:
+                try:
+                    poller()
+                except Exception as e:
+                    print(f"Event stream poller error: {e}")
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._poll)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _current(self):
+        return [current() for kind, position, current, replay in self.sources]
+
+    def _parse_cursor(self, last_event_id):
+        try:
+            positions = [int(part) for part in last_event_id.split('-')]
+        except (AttributeError, ValueError):
+            return None
+        return positions if len(positions) == len(self.sources) else None
+
+    def _replay(self, positions):
+        # None when the gap is too large to resend; the client then gets a reset and reloads
+        entries = []
+        for index, (kind, position, current, replay) in enumerate(self.sources):
+            entries.extend((kind, data) for data in replay(positions[index]))
+        return entries if len(entries) <= self.history.maxlen else None
+
+    def stream(self, last_event_id=None):
+        with self.condition:
+            self.listeners += 1
+            seq = self.last_id
+        try:
+            current = self._current()
+            positions = self._parse_cursor(last_event_id) if last_event_id else current
+            # A cursor from another install, or from before the log was cleared, cannot be resumed
+            entries = None
+            if positions is not None and all(p <= c for p, c in zip(positions, current)):
+                entries = self._replay(positions)
+            yield "retry: 3000\n\n"
+            while True:
+                if entries is None:
+                    positions = self._current()
+                    yield format_sse('-'.join(map(str, positions)), 'reset', {})
+                    entries = []
+                for kind, data in entries:
+                    message = self._message(positions, kind, data)
+                    if message:
+                        yield message
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed or self.last_id > seq, self.heartbeat)
+                    if self.closed:
+                        return
+                    fell_behind = seq < self.dropped_id
+                    entries = [(kind, data) for event_id, kind, data in self.history if event_id > seq]
+                    seq = self.last_id
+                if fell_behind:
+                    # Messages were dropped from history before this client read them; reload from disk
+                    entries = self._replay(positions)
+                elif not entries:
+                    yield ": keepalive\n\n"
+        finally:
+            with self.condition:
+                self.listeners -= 1
+
+    def _message(self, positions, kind, data):
+        # Updates positions in place; anything at or before the client's cursor was already delivered
+        for index, (source_kind, position, current, replay) in enumerate(self.sources):
+            if source_kind == kind:
+                value = position(data)
+                if value <= positions[index]:
+                    return None
+                positions[index] = value
+                return format_sse('-'.join(map(str, positions)), kind, data)
+        return format_sse(None, kind, data)
@@ -3,83 +3,272 @@ import os
 from PIL import ImageGrab
 from datetime import datetime
 import threading
+import time
+from motion_detector import MotionDetector
+from perceptual_hash import DuplicateFilter
+from evidence_store import EvidenceStore, PRIORITY_PROTECTED
+from encoding_policy import load_policies, get_policy, to_bgr
+from screen_delta import ScreenDeltaRecorder
+
+TRIGGER_PRIORITY = {'theft': PRIORITY_PROTECTED}
 
 class EvidenceCapture:
-    def __init__(self):
+    def __init__(self, motion_sensitivity=0.02):
         self.evidence_dir = "data/evidence"
         self.ensure_evidence_directory()
+        self.store = EvidenceStore(self.evidence_dir)
+        self.encoding_policies = load_policies()
+        self.screen_recorder = ScreenDeltaRecorder(self.store)
+        self.motion_detector = MotionDetector(sensitivity=motion_sensitivity)
+        self.camera = None
+        self.camera_lock = threading.Lock()
+        self.duplicate_filter = DuplicateFilter({'webcam': (int(os.environ.get('WEBCAM_DEDUP_BITS', 16)),
+                                                            int(os.environ.get('WEBCAM_DEDUP_CELL_CHANGE', 12)))})
+        self.dedupe_lock = threading.Lock()
     
     def ensure_evidence_directory(self):
         if not os.path.exists(self.evidence_dir):
             os.makedirs(self.evidence_dir)
     
-    def capture_webcam_photo(self):
-        try:
-            cap = cv2.VideoCapture(0)
-            if not cap.isOpened():
+    def open_stream(self):
+        with self.camera_lock:
+            if self.camera is not None and self.camera.isOpened():
+                return True
+            self.camera = cv2.VideoCapture(0)
+            if not self.camera.isOpened():
                 print("Cannot access webcam")
+                self.camera = None
+                return False
+            return True
+    
+    def close_stream(self):
+        with self.camera_lock:
+            if self.camera is not None:
+                self.camera.release()
+                self.camera = None
+    
+    def read_frame(self):
+        with self.camera_lock:
+            if self.camera is None:
                 return None
+            ret, frame = self.camera.read()
+            return frame if ret else None
+    
+    def _store_image(self, image, kind, write, priority=None):
+        # Near-duplicates of a recent capture are returned as a reference to the existing file
+        with self.dedupe_lock:
+            fingerprint, duplicate_of = self.duplicate_filter.check(image, kind)
+            if duplicate_of:
+                blob_id = self.store.blob_id_for_path(duplicate_of)
+                if blob_id and priority is not None:
+                    self.store.raise_priority(blob_id, priority)
+                return duplicate_of, True
             
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = os.path.join(self.evidence_dir, f"webcam_{timestamp}.jpg")
-                cv2.imwrite(filename, frame)
-                return filename
+            filename = write()
+            self.duplicate_filter.add(fingerprint, filename, kind)
+            return filename, False
+    
+    def _write_image(self, image, kind, trigger):
+        data, ext = get_policy(self.encoding_policies, trigger, kind).encode(image)
+        return self.store.put_bytes(data, ext, kind, priority=TRIGGER_PRIORITY.get(trigger))['path']
+    
+    def _store_webcam_frame(self, frame, trigger='default'):
+        return self._store_image(frame, 'webcam', lambda: self._write_image(frame, 'webcam', trigger),
+                                 TRIGGER_PRIORITY.get(trigger))
+    
+    def save_webcam_frame(self, frame, trigger='default'):
+        return self._store_webcam_frame(frame, trigger)[0]
+    
+    def _read_webcam_frame(self):
+        if self.camera is not None:
+            return self.read_frame()
+        
+        cap = cv2.VideoCapture(0)
+        if not cap.isOpened():
+            print("Cannot access webcam")
+            return None
+        
+        ret, frame = cap.read()
+        cap.release()
+        return frame if ret else None
+    
+    def _capture_webcam(self, trigger='default'):
+        try:
+            frame = self._read_webcam_frame()
+            if frame is not None:
+                return self._store_webcam_frame(frame, trigger)
         except Exception as e:
             print(f"Webcam capture error: {e}")
-        return None
+        return None, False
+    
+    def capture_webcam_photo(self, trigger='default'):
+        return self._capture_webcam(trigger)[0]
     
-    def capture_screenshot(self):
+    def _capture_screenshot(self, trigger='default'):
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(self.evidence_dir, f"screenshot_{timestamp}.png")
-            screenshot = ImageGrab.grab()
-            screenshot.save(filename)
-            return filename
+            screenshot = to_bgr(ImageGrab.grab())
+            return self._store_image(screenshot, 'screenshot',
+                                     lambda: self._write_image(screenshot, 'screenshot', trigger),
+                                     TRIGGER_PRIORITY.get(trigger))
         except Exception as e:
             print(f"Screenshot capture error: {e}")
+        return None, False
+    
+    def capture_screenshot(self, trigger='default'):
+        return self._capture_screenshot(trigger)[0]
+    
+    def capture_screenshot_delta(self):
+        try:
+            return self.screen_recorder.record(to_bgr(ImageGrab.grab()))['path']
+        except Exception as e:
+            print(f"Screenshot delta capture error: {e}")
         return None
     
-    def capture_evidence_set(self):
+    def capture_evidence_set(self, trigger='default', screenshot_mode='full'):
         results = {
             'timestamp': datetime.now().isoformat(),
             'webcam': None,
-            'screenshot': None
+            'screenshot': None,
+            'references': []
         }
         
-        webcam_file = self.capture_webcam_photo()
+        webcam_file, webcam_is_reference = self._capture_webcam(trigger)
         if webcam_file:
             results['webcam'] = webcam_file
+            if webcam_is_reference:
+                results['references'].append('webcam')
         
-        screenshot_file = self.capture_screenshot()
+        if screenshot_mode == 'delta':
+            screenshot_file, screenshot_is_reference = self.capture_screenshot_delta(), False
+        else:
+            screenshot_file, screenshot_is_reference = self._capture_screenshot(trigger)
         if screenshot_file:
             results['screenshot'] = screenshot_file
+            if screenshot_is_reference:
+                results['references'].append('screenshot')
         
         return results
     
-    def capture_multiple_photos(self, count=3, interval=2):
+    def capture_multiple_photos(self, count=3, interval=2, motion_gated=False, timeout=60, trigger='default',
+                                screenshot_mode='full'):
+        if motion_gated:
+            return self.capture_on_motion(count, interval, timeout, trigger, screenshot_mode)
+        
         captured = []
         for i in range(count):
-            result = self.capture_evidence_set()
+            result = self.capture_evidence_set(trigger, screenshot_mode)
             captured.append(result)
             if i < count - 1:
-                import time
                 time.sleep(interval)
         return captured
     
-    def get_evidence_files(self):
-        files = []
-        if os.path.exists(self.evidence_dir):
-            for filename in os.listdir(self.evidence_dir):
-                filepath = os.path.join(self.evidence_dir, filename)
-                if os.path.isfile(filepath):
-                    files.append({
-                        'filename': filename,
-                        'path': filepath,
-                        'size': os.path.getsize(filepath),
-                        'modified': datetime.fromtimestamp(os.path.getmtime(filepath)).isoformat()
-                    })
-        return sorted(files, key=lambda x: x['modified'], reverse=True)
+    def capture_on_motion(self, count=3, min_interval=2, timeout=60, trigger='default', screenshot_mode='full'):
+        captured = []
+        opened_here = self.camera is None
+        if not self.open_stream():
+            return captured
+        
+        try:
+            self.motion_detector.reset()
+            last_capture = 0
+            end_time = time.time() + timeout
+            while len(captured) < count and time.time() < end_time:
+                frame = self.read_frame()
+                if frame is None:
+                    break
+                
+                if not self.motion_detector.update(frame):
+                    continue
+                if time.time() - last_capture < min_interval:
+                    continue
+                
+                last_capture = time.time()
+                captured.append({
+                    'timestamp': datetime.now().isoformat(),
+                    'webcam': self.save_webcam_frame(frame, trigger),
+                    'screenshot': (self.capture_screenshot_delta() if screenshot_mode == 'delta'
+                                   else self.capture_screenshot(trigger)),
+                    'motion_score': round(self.motion_detector.last_score, 4)
+                })
+        except Exception as e:
+            print(f"Motion capture error: {e}")
+        finally:
+            if opened_here:
+                self.close_stream()
+        return captured
+    
+    def capture_video_clip(self, seconds=10, fps=10, resolution=(640, 480)):
+        # Frames go straight from the camera into the encoder; nothing is buffered beyond the current frame
+        opened_here = self.camera is None
+        if not self.open_stream():
+            return None
+        
+        tmp_dir = os.path.join(self.evidence_dir, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f"clip_{threading.get_ident()}_{time.time_ns()}.mp4")
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(resolution))
+        frames_written = 0
+        
+        try:
+            if not writer.isOpened():
+                print("Cannot open video writer")
+                return None
+            
+            frame_interval = 1.0 / fps
+            next_frame_time = time.monotonic()
+            for _ in range(int(seconds * fps)):
+                frame = self.read_frame()
+                if frame is None:
+                    break
+                if (frame.shape[1], frame.shape[0]) != tuple(resolution):
+                    frame = cv2.resize(frame, tuple(resolution), interpolation=cv2.INTER_AREA)
+                writer.write(frame)
+                frames_written += 1
+                
+                next_frame_time += frame_interval
+                delay = next_frame_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        except Exception as e:
+            print(f"Clip capture error: {e}")
+        finally:
+            writer.release()
+            if opened_here:
+                self.close_stream()
+        
+        if frames_written == 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        
+        record = self.store.put_file(tmp_path, '.mp4', 'clip', meta={
+            'seconds': round(frames_written / fps, 2),
+            'fps': fps,
+            'resolution': list(resolution),
+            'frames': frames_written
+        })
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'clip': record['path'],
+            'clip_id': record['id']
+        }
+    
+    def get_evidence_files(self, offset=0, limit=None):
+        return [{
+            'id': record['id'],
+            'filename': record['filename'],
+            'path': record['path'],
+            'kind': record['kind'],
+            'size': record['size'],
+            'modified': record['created']
+        } for record in self.store.list_records(offset, limit)]
+    
+    def count_evidence_files(self):
+        return self.store.count()
+    
+    def reconcile_evidence(self):
+        try:
+            return self.store.reconcile()
+        except Exception as e:
+            print(f"Evidence reconcile error: {e}")
+            return None
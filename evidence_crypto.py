@@ -0,0 +1,192 @@
+import os
+import struct
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from Crypto.Random import get_random_bytes
+
+# File layout: header (magic, chunk size, nonce prefix), then AES-GCM chunks of
+# chunk_size plaintext bytes each followed by a 16 byte tag. Chunk i uses the nonce
+# prefix || i || final flag, so chunks cannot be reordered, and dropping trailing chunks is detected.
+MAGIC = b'AEV1'
+HEADER = struct.Struct('>4sI7s')
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+def load_evidence_key():
+    if os.environ.get('EVIDENCE_ENCRYPTION') != '1':
+        return None
+    from api_auth_manager import APIAuthManager
+    return HKDF(APIAuthManager().get_server_key(), 32, b'', SHA256, context=b'evidence-at-rest')
+
+def _nonce(prefix, index, final):
+    return prefix + struct.pack('>IB', index, 1 if final else 0)
+
+class EncryptedWriter:
+    def __init__(self, fileobj, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.key = key
+        self.chunk_size = chunk_size
+        self.prefix = get_random_bytes(7)
+        self.header = HEADER.pack(MAGIC, chunk_size, self.prefix)
+        self.index = 0
+        self.buffer = bytearray()
+        self.fileobj.write(self.header)
+
+    def _seal(self, data, final):
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=_nonce(self.prefix, self.index, final))
+        cipher.update(self.header)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        self.fileobj.write(ciphertext)
+        self.fileobj.write(tag)
+        self.index += 1
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) > self.chunk_size:
+            # Hold back the tail so close() can seal the last chunk as final, even when it is full
+            end = (len(self.buffer) - 1) // self.chunk_size * self.chunk_size
+            view = memoryview(self.buffer)
+            for start in range(0, end, self.chunk_size):
+                self._seal(view[start:start + self.chunk_size], False)
+            view.release()
+            del self.buffer[:end]
+        return len(data)
+
+    def close(self):
+        self._seal(bytes(self.buffer), True)
+        self.buffer = bytearray()
+
+class EncryptedReader:
+    def __init__(self, path, key):
+        self.key = key
+        self.file = open(path, 'rb')
+        try:
+            self.header = self.file.read(HEADER.size)
+            if len(self.header) != HEADER.size:
+                raise ValueError(f"{path} is not an encrypted evidence file")
+            magic, self.chunk_size, self.prefix = HEADER.unpack(self.header)
+            if magic != MAGIC or self.chunk_size <= 0:
+                raise ValueError(f"{path} is not an encrypted evidence file")
+
+            body = os.fstat(self.file.fileno()).st_size - HEADER.size
+            self.stride = self.chunk_size + TAG_SIZE
+            self.chunk_count = max(1, -(-body // self.stride))
+            self.size = body - self.chunk_count * TAG_SIZE
+            if self.size - (self.chunk_count - 1) * self.chunk_size < 0:
+                raise ValueError(f"{path} is truncated")
+        except Exception:
+            self.file.close()
+            raise
+        self.position = 0
+        self.cached = (None, b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read_chunk(self, index):
+        if self.cached[0] == index:
+            return self.cached[1]
+        final = index == self.chunk_count - 1
+        length = min(self.chunk_size, self.size - index * self.chunk_size)
+        self.file.seek(HEADER.size + index * self.stride)
+        data = self.file.read(length + TAG_SIZE)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=_nonce(self.prefix, index, final))
+        cipher.update(self.header)
+        plaintext = cipher.decrypt_and_verify(data[:-TAG_SIZE], data[-TAG_SIZE:])
+        self.cached = (index, plaintext)
+        return plaintext
+
+    def iter_range(self, start, stop):
+        # Only the chunks overlapping [start, stop) are read and authenticated
+        stop = min(stop, self.size)
+        while start < stop:
+            index, offset = divmod(start, self.chunk_size)
+            chunk = self.read_chunk(index)[offset:offset + stop - start]
+            start += len(chunk)
+            yield chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        stop = self.size if size is None or size < 0 else self.position + size
+        data = b''.join(self.iter_range(self.position, stop))
+        self.position += len(data)
+        return data
+
+def open_evidence(path, key=None):
+    return EncryptedReader(path, key) if key else open(path, 'rb')
+
+def encrypt_stream(chunks, fileobj, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = EncryptedWriter(fileobj, key, chunk_size)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+def read_chunks(path, size=1024 * 1024):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(size), b'')
+
+
+if __name__ == '__main__':
+    import argparse
+    import random
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark chunked evidence encryption")
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--chunk-kb', type=int, default=DEFAULT_CHUNK_SIZE // 1024)
+    parser.add_argument('--ranges', type=int, default=200)
+    args = parser.parse_args()
+
+    key = get_random_bytes(32)
+    chunk_size = args.chunk_kb * 1024
+    source = os.urandom(args.size_mb * 1024 * 1024)
+    path = os.path.join(tempfile.mkdtemp(), "clip.enc")
+
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        encrypt_stream((source[i:i + 1024 * 1024] for i in range(0, len(source), 1024 * 1024)), f, key, chunk_size)
+    encrypt_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with EncryptedReader(path, key) as reader:
+        assert reader.read() == source
+    decrypt_seconds = time.perf_counter() - start
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with EncryptedReader(path, key) as reader:
+        for _ in range(args.ranges):
+            offset = rng.randrange(len(source))
+            length = rng.randrange(1, 256 * 1024)
+            assert b''.join(reader.iter_range(offset, offset + length)) == source[offset:offset + length]
+    range_ms = (time.perf_counter() - start) * 1000 / args.ranges
+
+    overhead = os.path.getsize(path) - len(source)
+    print(f"Encrypt:         {args.size_mb / encrypt_seconds:8.1f} MB/s")
+    print(f"Decrypt:         {args.size_mb / decrypt_seconds:8.1f} MB/s")
+    print(f"Random range:    {range_ms:8.2f} ms per read (up to 256 KB)")
+    print(f"Size overhead:   {overhead} bytes ({overhead / len(source) * 100:.3f}%)")
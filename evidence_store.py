@@ -0,0 +1,384 @@
+import glob
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from evidence_crypto import encrypt_stream, load_evidence_key, open_evidence, read_chunks
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_PROTECTED = 2
+
+KIND_PRIORITY = {
+    'screenshot': PRIORITY_LOW,
+    'screen_delta': PRIORITY_LOW,
+    'screen_keyframe': PRIORITY_NORMAL,
+    'webcam': PRIORITY_NORMAL
+}
+
+class EvidenceStore:
+    SKIP_SUFFIXES = ('.tmp', '.jsonl')
+
+    def __init__(self, root="data/evidence", max_bytes=None, max_files=None, key=None):
+        self.root = root
+        # New blobs are encrypted when a key is configured; the 'encrypted' flag on each record
+        # keeps older plaintext blobs readable
+        self.key = key if key is not None else load_evidence_key()
+        self.max_bytes = max_bytes or int(os.environ.get('EVIDENCE_MAX_BYTES', 1024 ** 3))
+        self.max_files = max_files or int(os.environ.get('EVIDENCE_MAX_FILES', 5000))
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifest_file = os.path.join(root, "manifest.jsonl")
+        # ThumbnailCache writes here; thumbnails go when their blob goes, so they stay within the quota's reach
+        self.thumbs_dir = os.path.join(root, "thumbs")
+        self.lock = threading.RLock()
+        # blobs keeps capture order, so newest-first pages are a reversed slice
+        self.blobs = {}
+        self.needs_sort = False
+        self.events = {}
+        # Per-priority queues in insertion order make "oldest low-priority blob" an O(1) lookup
+        self.eviction_queues = {PRIORITY_LOW: {}, PRIORITY_NORMAL: {}, PRIORITY_PROTECTED: {}}
+        # Screen keyframe id -> its delta frames in capture order
+        self.delta_groups = {}
+        self.total_bytes = 0
+        self.manifest_offset = 0
+        self.ensure_directories()
+        self.refresh()
+
+    def ensure_directories(self):
+        if not os.path.exists(self.objects_dir):
+            os.makedirs(self.objects_dir)
+
+    def blob_path(self, blob_id, ext):
+        return os.path.join(self.objects_dir, blob_id[:2], f"{blob_id}{ext}")
+
+    def refresh(self):
+        # Other processes (GUI, server workers) append to the same manifest; replay only the new tail
+        with self.lock:
+            try:
+                if os.path.getsize(self.manifest_file) <= self.manifest_offset:
+                    return
+            except OSError:
+                return
+
+            with open(self.manifest_file, 'rb') as f:
+                f.seek(self.manifest_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self.manifest_offset += len(line)
+                    try:
+                        self.apply(json.loads(line))
+                    except ValueError:
+                        continue
+
+    def apply(self, entry):
+        op = entry.get('op')
+        if op == 'add':
+            record = {k: v for k, v in entry.items() if k != 'op'}
+            record.setdefault('priority', KIND_PRIORITY.get(record['kind'], PRIORITY_NORMAL))
+            self._forget(record['id'])
+            if self.blobs and record['created'] < next(reversed(self.blobs.values()))['created']:
+                # Reconciled files keep their old mtime; re-sort lazily before the next listing
+                self.needs_sort = True
+            self.blobs[record['id']] = record
+            self.eviction_queues[record['priority']][record['id']] = True
+            self.total_bytes += record['size']
+            keyframe_id = (record.get('meta') or {}).get('keyframe')
+            if record['kind'] == 'screen_delta' and keyframe_id:
+                self.delta_groups.setdefault(keyframe_id, {})[record['id']] = True
+        elif op == 'remove':
+            self._forget(entry['id'])
+        elif op == 'tag':
+            record = self.blobs.get(entry['id'])
+            if record:
+                record['meta'] = dict(record.get('meta') or {}, **entry['meta'])
+        elif op == 'priority':
+            record = self.blobs.get(entry['id'])
+            if record and entry['priority'] != record['priority']:
+                self.eviction_queues[record['priority']].pop(record['id'], None)
+                record['priority'] = entry['priority']
+                self.eviction_queues[record['priority']][record['id']] = True
+        elif op == 'link':
+            blob_ids = self.events.setdefault(entry['event_id'], [])
+            for blob_id in entry['blobs']:
+                if blob_id not in blob_ids:
+                    blob_ids.append(blob_id)
+
+    def _forget(self, blob_id):
+        record = self.blobs.pop(blob_id, None)
+        if record:
+            self.eviction_queues[record['priority']].pop(blob_id, None)
+            self.total_bytes -= record['size']
+            group = self.delta_groups.get((record.get('meta') or {}).get('keyframe'))
+            if group is not None:
+                group.pop(blob_id, None)
+
+    def append(self, entry):
+        line = json.dumps(entry) + '\n'
+        with open(self.manifest_file, 'a') as f:
+            f.write(line)
+        self.refresh()
+
+    def _add(self, blob_id, ext, kind, size, meta, path=None, created=None, encrypted=False, priority=None):
+        path = path or self.blob_path(blob_id, ext)
+        entry = {
+            'op': 'add',
+            'id': blob_id,
+            'path': path,
+            'filename': os.path.basename(path),
+            'kind': kind,
+            'ext': ext,
+            'size': size,
+            'created': created or datetime.now().isoformat()
+        }
+        if meta:
+            entry['meta'] = meta
+        if encrypted:
+            entry['encrypted'] = True
+        if priority is not None:
+            entry['priority'] = max(priority, KIND_PRIORITY.get(kind, PRIORITY_NORMAL))
+        self.append(entry)
+        return self.blobs[blob_id]
+
+    def _write_atomic(self, path, chunks):
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if self.key:
+                    encrypt_stream(chunks, f, self.key)
+                else:
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_bytes(self, data, ext, kind, meta=None, priority=None):
+        # priority is applied before enforce_quota runs, so a capture can't evict its own siblings
+        blob_id = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.refresh()
+            if blob_id in self.blobs and os.path.exists(self.blobs[blob_id]['path']):
+                if priority is not None:
+                    self.raise_priority(blob_id, priority)
+                return self.blobs[blob_id]
+            self._write_atomic(self.blob_path(blob_id, ext), [data])
+            record = self._add(blob_id, ext, kind, len(data), meta, encrypted=bool(self.key), priority=priority)
+            self.enforce_quota(keep=blob_id)
+            return record
+
+    def hash_file(self, path):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def put_file(self, src_path, ext, kind, meta=None, priority=None):
+        blob_id = self.hash_file(src_path)
+
+        with self.lock:
+            self.refresh()
+            if blob_id in self.blobs and os.path.exists(self.blobs[blob_id]['path']):
+                os.remove(src_path)
+                if priority is not None:
+                    self.raise_priority(blob_id, priority)
+                return self.blobs[blob_id]
+            path = self.blob_path(blob_id, ext)
+            size = os.path.getsize(src_path)
+            if self.key:
+                self._write_atomic(path, read_chunks(src_path))
+                os.remove(src_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(src_path, path)
+            record = self._add(blob_id, ext, kind, size, meta, encrypted=bool(self.key), priority=priority)
+            self.enforce_quota(keep=blob_id)
+            return record
+
+    def open_blob(self, record):
+        if record.get('encrypted') and not self.key:
+            raise ValueError(f"Evidence {record['id']} is encrypted; set EVIDENCE_ENCRYPTION=1 to read it")
+        return open_evidence(record['path'], self.key if record.get('encrypted') else None)
+
+    def read_bytes(self, record):
+        with self.open_blob(record) as f:
+            return f.read()
+
+    def get(self, blob_id):
+        with self.lock:
+            record = self.blobs.get(blob_id)
+            if record is None:
+                self.refresh()
+                record = self.blobs.get(blob_id)
+            return record
+
+    def blob_id_for_path(self, path):
+        if not path:
+            return None
+        blob_id = os.path.splitext(os.path.basename(path))[0]
+        return blob_id if self.get(blob_id) else None
+
+    def link_event(self, event_id, paths, priority=None):
+        blob_ids = [b for b in (self.blob_id_for_path(p) for p in paths) if b]
+        if not blob_ids:
+            return []
+        with self.lock:
+            self.append({'op': 'link', 'event_id': event_id, 'blobs': blob_ids})
+            if priority is not None:
+                for blob_id in blob_ids:
+                    self.raise_priority(blob_id, priority)
+        return blob_ids
+
+    def tag(self, blob_id, meta):
+        with self.lock:
+            if self.get(blob_id):
+                self.append({'op': 'tag', 'id': blob_id, 'meta': meta})
+
+    def raise_priority(self, blob_id, priority):
+        with self.lock:
+            # A delta frame is useless without the frames it builds on, so its ancestors are raised too
+            while blob_id:
+                record = self.get(blob_id)
+                if not record or priority <= record['priority']:
+                    break
+                self.append({'op': 'priority', 'id': blob_id, 'priority': priority})
+                blob_id = (record.get('meta') or {}).get('parent')
+
+    def over_quota(self):
+        return self.total_bytes > self.max_bytes or len(self.blobs) > self.max_files
+
+    def eviction_unit(self, blob_id):
+        # A screen keyframe and its deltas leave the store together. If part of the chain is protected,
+        # only the victim and the frames built on top of it go, so no delta is left without its parent
+        record = self.blobs[blob_id]
+        keyframe_id = blob_id if record['kind'] == 'screen_keyframe' else (record.get('meta') or {}).get('keyframe')
+        group = self.delta_groups.get(keyframe_id)
+        if not group:
+            return [blob_id]
+
+        members = ([keyframe_id] if keyframe_id in self.blobs else []) + list(group)
+        if all(self.blobs[m]['priority'] < PRIORITY_PROTECTED for m in members):
+            return members
+        unit = [blob_id]
+        for delta_id in group:
+            if self.blobs[delta_id]['meta'].get('parent') in unit and delta_id not in unit:
+                unit.append(delta_id)
+        return unit
+
+    def enforce_quota(self, keep=None):
+        # Counters are maintained incrementally by apply(), so this never rescans the directory
+        evicted = []
+        with self.lock:
+            while self.over_quota():
+                unit = None
+                for priority in (PRIORITY_LOW, PRIORITY_NORMAL):
+                    for candidate in self.eviction_queues[priority]:
+                        candidate_unit = self.eviction_unit(candidate)
+                        if keep not in candidate_unit:
+                            unit = candidate_unit
+                            break
+                    if unit:
+                        break
+                if unit is None:
+                    print("Warning: evidence quota exceeded but only protected evidence remains")
+                    break
+                for blob_id in unit:
+                    self.remove(blob_id)
+                evicted.extend(unit)
+        return evicted
+
+    def usage(self):
+        with self.lock:
+            self.refresh()
+            return {
+                'bytes': self.total_bytes,
+                'files': len(self.blobs),
+                'max_bytes': self.max_bytes,
+                'max_files': self.max_files
+            }
+
+    def get_event_blobs(self, event_id):
+        with self.lock:
+            self.refresh()
+            return [self.blobs[b] for b in self.events.get(event_id, []) if b in self.blobs]
+
+    def remove(self, blob_id, delete_file=True):
+        with self.lock:
+            record = self.get(blob_id)
+            if record is None:
+                return False
+            if delete_file and os.path.exists(record['path']):
+                os.remove(record['path'])
+            self.append({'op': 'remove', 'id': blob_id})
+        for thumb_path in glob.glob(os.path.join(glob.escape(self.thumbs_dir), f"{glob.escape(blob_id)}_*.jpg")):
+            try:
+                os.remove(thumb_path)
+            except OSError:
+                pass
+        return True
+
+    def count(self):
+        with self.lock:
+            self.refresh()
+            return len(self.blobs)
+
+    def list_records(self, offset=0, limit=20):
+        with self.lock:
+            self.refresh()
+            if self.needs_sort:
+                self.blobs = dict(sorted(self.blobs.items(), key=lambda item: item[1]['created']))
+                self.needs_sort = False
+            newest_first = reversed(self.blobs.values())
+            stop = offset + limit if limit is not None else None
+            return list(itertools.islice(newest_first, offset, stop))
+
+    def records(self):
+        return self.list_records(limit=None)
+
+    def _scan_files(self):
+        for filename in os.listdir(self.root):
+            path = os.path.join(self.root, filename)
+            if os.path.isfile(path) and not filename.endswith(self.SKIP_SUFFIXES):
+                yield path
+
+        for shard in os.listdir(self.objects_dir):
+            shard_dir = os.path.join(self.objects_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for filename in os.listdir(shard_dir):
+                if not filename.endswith(self.SKIP_SUFFIXES):
+                    yield os.path.join(shard_dir, filename)
+
+    def reconcile(self):
+        # Full scan, meant for startup or an explicit refresh: picks up files added or deleted outside the app
+        added = 0
+        removed = 0
+        with self.lock:
+            self.refresh()
+            for blob_id, record in list(self.blobs.items()):
+                if not os.path.exists(record['path']):
+                    self.remove(blob_id, delete_file=False)
+                    removed += 1
+
+            known_paths = {os.path.normpath(record['path']) for record in self.blobs.values()}
+            unknown = [p for p in self._scan_files() if os.path.normpath(p) not in known_paths]
+            for path in sorted(unknown, key=os.path.getmtime):
+                name, ext = os.path.splitext(os.path.basename(path))
+                kind = name.split('_', 1)[0] if '_' in name else 'file'
+                blob_id = self.hash_file(path)
+                if blob_id in self.blobs:
+                    continue
+                stat = os.stat(path)
+                self._add(blob_id, ext, kind, stat.st_size, None, path=path,
+                          created=datetime.fromtimestamp(stat.st_mtime).isoformat())
+                added += 1
+        return {'added': added, 'removed': removed}
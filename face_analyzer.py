@@ -0,0 +1,130 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from evidence_crypto import open_evidence
+
+_cascade = None
+
+def is_available():
+    # OpenCV 5 moved the Haar cascades out of the main package
+    return hasattr(cv2, 'CascadeClassifier')
+
+def _get_cascade():
+    global _cascade
+    if _cascade is None:
+        cv2.setNumThreads(1)
+        _cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+    return _cascade
+
+def detect_faces(image_path, max_width=640, key=None):
+    # Runs in a worker process; each process loads the cascade once
+    if key:
+        with open_evidence(image_path, key) as f:
+            image = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+
+    scale = 1.0
+    if image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    image = cv2.equalizeHist(image)
+
+    faces = _get_cascade().detectMultiScale(image, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    return [[int(round(v / scale)) for v in face] for face in faces]
+
+class FaceAnalyzer:
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+    def __init__(self, store, workers=None, on_faces=None):
+        self.store = store
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.on_faces = on_faces
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def submit(self, record):
+        if not is_available():
+            return None
+        if not record or record.get('kind') != 'webcam':
+            return None
+        if not record['path'].lower().endswith(self.IMAGE_EXTENSIONS):
+            return None
+        key = self.store.key if record.get('encrypted') else None
+        future = self.get_executor().submit(detect_faces, record['path'], key=key)
+        future.add_done_callback(lambda f: self._tag(record['id'], f))
+        return future
+
+    def _tag(self, blob_id, future):
+        try:
+            faces = future.result()
+        except Exception as e:
+            print(f"Face analysis error: {e}")
+            return
+        if faces is None:
+            return
+        self.store.tag(blob_id, {'faces': len(faces), 'face_boxes': faces})
+        if faces and self.on_faces:
+            self.on_faces(blob_id, faces)
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+
+def benchmark(paths, workers=None, repeat=1):
+    import time
+
+    workers = workers or os.cpu_count() or 1
+    jobs = list(paths) * repeat
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(detect_faces, jobs[:workers]))
+        start = time.perf_counter()
+        results = list(executor.map(detect_faces, jobs, chunksize=4))
+        elapsed = time.perf_counter() - start
+    frames_per_second = len(jobs) / elapsed if elapsed else 0
+    return {
+        'frames': len(jobs),
+        'workers': workers,
+        'frames_with_faces': sum(1 for faces in results if faces),
+        'frames_per_second': round(frames_per_second, 1),
+        'frames_per_second_per_core': round(frames_per_second / workers, 1)
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Benchmark Haar cascade face detection throughput")
+    parser.add_argument('paths', nargs='*', help="Images to analyse (synthetic 640x480 frames if omitted)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if not is_available():
+        parser.exit(1, f"OpenCV {cv2.__version__} has no CascadeClassifier; install opencv-python 4.x\n")
+
+    paths = args.paths
+    if not paths:
+        tmp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        for i in range(20):
+            path = os.path.join(tmp_dir, f"frame_{i}.jpg")
+            cv2.imwrite(path, rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+            paths.append(path)
+
+    print(json.dumps(benchmark(paths, args.workers, args.repeat), indent=2))
@@ -0,0 +1,285 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SAFE_DEVICE_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+SAFE_EVIDENCE_ID = re.compile(r'^[0-9a-f]{64}$')
+
+class DeviceExistsError(Exception):
+    pass
+
+class EvidenceTooLargeError(Exception):
+    pass
+
+def hash_key(api_key):
+    # Device keys are 256-bit random tokens, so a plain SHA-256 is enough and keeps lookups O(1)
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+class FleetRegistry:
+    def __init__(self, root="data/fleet"):
+        self.root = root
+        self.devices_dir = os.path.join(root, "devices")
+        self.journal_file = os.path.join(root, "registry.jsonl")
+        self.lock = threading.RLock()
+        self.devices = {}
+        self.key_index = {}
+        self.last_seen = {}
+        self.journal_offset = 0
+        os.makedirs(self.devices_dir, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        # Same append-only journal as the evidence manifest, so every worker sees enrollments
+        with self.lock:
+            try:
+                if os.path.getsize(self.journal_file) <= self.journal_offset:
+                    return
+            except OSError:
+                return
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self.journal_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self.journal_offset += len(line)
+                    try:
+                        self.apply(json.loads(line))
+                    except ValueError:
+                        continue
+
+    def apply(self, entry):
+        op = entry.get('op')
+        if op == 'enroll':
+            old = self.devices.get(entry['device_id'])
+            if old:
+                self.key_index.pop(old['key_hash'], None)
+            record = {k: v for k, v in entry.items() if k != 'op'}
+            self.devices[record['device_id']] = record
+            self.key_index[record['key_hash']] = record['device_id']
+        elif op == 'rotate':
+            record = self.devices.get(entry['device_id'])
+            if record:
+                self.key_index.pop(record['key_hash'], None)
+                record['key_hash'] = entry['key_hash']
+                record['rotated_at'] = entry['rotated_at']
+                self.key_index[record['key_hash']] = record['device_id']
+        elif op == 'revoke':
+            record = self.devices.pop(entry['device_id'], None)
+            if record:
+                self.key_index.pop(record['key_hash'], None)
+
+    def append(self, entry):
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.refresh()
+
+    @contextmanager
+    def writer_lock(self):
+        # Check-then-append must be atomic across server workers, not just threads
+        with self.lock, open(self.journal_file + ".lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.refresh()
+            yield
+
+    def device_dir(self, device_id):
+        return os.path.join(self.devices_dir, device_id[:2], device_id)
+
+    def enroll(self, device_id=None, name=None, metadata=None):
+        device_id = device_id or str(uuid.uuid4())
+        if not SAFE_DEVICE_ID.match(device_id):
+            raise ValueError("Device id may only contain letters, digits, '-' and '_'")
+        api_key = secrets.token_urlsafe(32)
+        with self.writer_lock():
+            if device_id in self.devices:
+                raise DeviceExistsError(f"Device {device_id} is already enrolled; rotate its key instead")
+            self.append({
+                'op': 'enroll',
+                'device_id': device_id,
+                'name': name or device_id,
+                'metadata': metadata or {},
+                'key_hash': hash_key(api_key),
+                'enrolled_at': datetime.now().isoformat()
+            })
+        os.makedirs(os.path.join(self.device_dir(device_id), "evidence"), exist_ok=True)
+        return device_id, api_key
+
+    def rotate_key(self, device_id):
+        api_key = secrets.token_urlsafe(32)
+        with self.writer_lock():
+            if device_id not in self.devices:
+                return None
+            self.append({
+                'op': 'rotate',
+                'device_id': device_id,
+                'key_hash': hash_key(api_key),
+                'rotated_at': datetime.now().isoformat()
+            })
+        return api_key
+
+    def revoke(self, device_id):
+        with self.writer_lock():
+            if device_id not in self.devices:
+                return False
+            self.append({'op': 'revoke', 'device_id': device_id, 'revoked_at': datetime.now().isoformat()})
+            return True
+
+    def authenticate(self, api_key):
+        if not api_key:
+            return None
+        key_hash = hash_key(api_key)
+        with self.lock:
+            device_id = self.key_index.get(key_hash)
+            if device_id is None:
+                self.refresh()
+                device_id = self.key_index.get(key_hash)
+            return device_id
+
+    def get(self, device_id):
+        with self.lock:
+            record = self.devices.get(device_id)
+            if record is None:
+                self.refresh()
+                record = self.devices.get(device_id)
+            if record is None:
+                return None
+            summary = {k: v for k, v in record.items() if k != 'key_hash'}
+        summary['last_seen'] = self.get_last_seen(device_id)
+        return summary
+
+    def count(self):
+        with self.lock:
+            self.refresh()
+            return len(self.devices)
+
+    def list_devices(self, offset=0, limit=50):
+        with self.lock:
+            self.refresh()
+            device_ids = list(itertools.islice(self.devices, offset, offset + limit))
+        return [self.get(device_id) for device_id in device_ids]
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def record_report(self, device_id, report):
+        status = dict(report, device_id=device_id, received_at=datetime.now().isoformat())
+        self._write_atomic(os.path.join(self.device_dir(device_id), "status.json"), status)
+        with self.lock:
+            self.last_seen[device_id] = status['received_at']
+        return status
+
+    def get_status(self, device_id):
+        path = os.path.join(self.device_dir(device_id), "status.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def get_last_seen(self, device_id):
+        with self.lock:
+            last_seen = self.last_seen.get(device_id)
+        if last_seen is None:
+            # Reported to another worker; the status file's mtime is the fallback
+            path = os.path.join(self.device_dir(device_id), "status.json")
+            if os.path.exists(path):
+                last_seen = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+        return last_seen
+
+    def append_events(self, device_id, events):
+        path = os.path.join(self.device_dir(device_id), "events.jsonl")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(''.join(json.dumps(event) + '\n' for event in events))
+        return len(events)
+
+    def recent_events(self, device_id, count=20):
+        path = os.path.join(self.device_dir(device_id), "events.jsonl")
+        if not os.path.exists(path):
+            return []
+        # Read backwards from the end so long histories cost the same as short ones
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= count:
+                step = min(64 * 1024, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.splitlines()[-count:] if count > 0 else []
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def store_evidence(self, device_id, stream, filename, max_bytes=None):
+        ext = os.path.splitext(os.path.basename(filename or ''))[1].lower()[:8]
+        evidence_dir = os.path.join(self.device_dir(device_id), "evidence")
+        os.makedirs(evidence_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=evidence_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise EvidenceTooLargeError(f"Evidence larger than {max_bytes} bytes")
+                    sha.update(chunk)
+                    f.write(chunk)
+            path = os.path.join(evidence_dir, f"{sha.hexdigest()}{ext}")
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'id': sha.hexdigest(), 'filename': os.path.basename(path), 'size': size}
+
+    def list_evidence(self, device_id, offset=0, limit=50):
+        evidence_dir = os.path.join(self.device_dir(device_id), "evidence")
+        try:
+            entries = [entry for entry in os.scandir(evidence_dir)
+                       if entry.is_file() and not entry.name.endswith('.tmp')]
+        except OSError:
+            return 0, []
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return len(entries), [{
+            'id': os.path.splitext(entry.name)[0],
+            'filename': entry.name,
+            'size': entry.stat().st_size,
+            'uploaded': datetime.fromtimestamp(entry.stat().st_mtime).isoformat()
+        } for entry in entries[offset:offset + limit]]
+
+    def evidence_path(self, device_id, evidence_id):
+        # Files are named <sha256><ext>, so the id alone finds the file without trusting a client path
+        if not SAFE_EVIDENCE_ID.match(evidence_id or ''):
+            return None
+        evidence_dir = os.path.join(self.device_dir(device_id), "evidence")
+        try:
+            names = os.listdir(evidence_dir)
+        except OSError:
+            return None
+        for name in names:
+            if os.path.splitext(name)[0] == evidence_id:
+                return os.path.join(evidence_dir, name)
+        return None
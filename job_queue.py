@@ -0,0 +1,232 @@
+import json
+import math
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+SAFE_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class JobQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+class JobQueue:
+    def __init__(self, workers=4, max_pending=32, history=500, jobs_dir="data/jobs", max_age=24 * 3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs_dir = jobs_dir
+        self.max_age = max_age
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.subscribers = []
+        self.accepting = True
+        self.reserved = 0
+        self.average_run_seconds = 1.0
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def start(self):
+        if self.threads:
+            return
+        self.prune()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def prune(self):
+        # _trim only removes files for jobs this process created, so files from earlier runs and other
+        # workers are aged out here; live jobs are rewritten on every state change and stay fresh
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for entry in os.scandir(self.jobs_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _job_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        # Job state is also written to disk so any server worker can answer /api/jobs/<id>
+        fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self._job_file(job['id']))
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Error saving job {job['id']}: {e}")
+
+    def retry_after(self):
+        pending = self.queue.qsize() + 1
+        return max(1, math.ceil(pending * self.average_run_seconds / self.workers))
+
+    def _has_room(self):
+        # Called with self.lock held; reserved slots count as taken
+        return self.accepting and self.queue.qsize() + self.reserved < self.max_pending
+
+    @contextmanager
+    def reserve(self):
+        # Claims a slot before the caller applies a side effect (a lock, an alarm), so the follow-up
+        # submit cannot be refused after the effect has already happened
+        with self.lock:
+            if not self._has_room():
+                raise JobQueueFull(self.retry_after())
+            self.reserved += 1
+        slot = {'held': True}
+        try:
+            yield lambda job_type, func, *args, **kwargs: self._submit(slot, job_type, func, args, kwargs)
+        finally:
+            with self.lock:
+                if slot['held']:
+                    slot['held'] = False
+                    self.reserved -= 1
+
+    def submit(self, job_type, func, *args, **kwargs):
+        return self._submit(None, job_type, func, args, kwargs)
+
+    def _submit(self, slot, job_type, func, args, kwargs):
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'status': 'queued',
+            'created': datetime.now().isoformat(),
+            'started': None,
+            'finished': None,
+            'queue_ms': None,
+            'run_ms': None,
+            'result': None,
+            'error': None
+        }
+        with self.lock:
+            if slot is not None and slot['held']:
+                slot['held'] = False
+                self.reserved -= 1
+            elif not self._has_room():
+                raise JobQueueFull(self.retry_after())
+            try:
+                self.queue.put_nowait((job['id'], time.monotonic(), func, args, kwargs))
+            except queue.Full:
+                raise JobQueueFull(self.retry_after())
+            self.jobs[job['id']] = job
+            self._trim()
+        self._save(job)
+        return dict(job)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] in ('succeeded', 'failed')]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+            try:
+                os.remove(self._job_file(job_id))
+            except OSError:
+                pass
+
+    def _update(self, job_id, **changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(changes)
+            snapshot = dict(job)
+        self._save(snapshot)
+        return snapshot
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def notify(self, job):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(dict(job))
+            except Exception as e:
+                print(f"Job subscriber error: {e}")
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            job_id, queued_at, func, args, kwargs = item
+            started = time.monotonic()
+            self._update(job_id, status='running', started=datetime.now().isoformat(),
+                         queue_ms=round((started - queued_at) * 1000, 1))
+            try:
+                result = func(*args, **kwargs)
+                changes = {'status': 'succeeded', 'result': result}
+            except Exception as e:
+                traceback.print_exc()
+                changes = {'status': 'failed', 'error': str(e)}
+            run_seconds = time.monotonic() - started
+            self.average_run_seconds = 0.8 * self.average_run_seconds + 0.2 * run_seconds
+            job = self._update(job_id, finished=datetime.now().isoformat(), run_ms=round(run_seconds * 1000, 1), **changes)
+            if job is not None:
+                self.notify(job)
+            self.queue.task_done()
+
+    def get(self, job_id):
+        if not SAFE_JOB_ID.match(job_id or ''):
+            return None
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        try:
+            with open(self._job_file(job_id), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def wait(self, job_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('succeeded', 'failed') or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.05)
+
+    def stats(self):
+        with self.lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        return {
+            'workers': self.workers,
+            'pending': self.queue.qsize(),
+            'max_pending': self.max_pending,
+            'running': statuses.count('running'),
+            'accepting': self.accepting
+        }
+
+    def shutdown(self, timeout=30):
+        # Stop taking new jobs, let the workers finish everything already queued, then exit
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        for _ in self.threads:
+            try:
+                self.queue.put(None, timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in self.threads:
+            thread.join(max(0.1, deadline - time.monotonic()))
+        self.threads = []
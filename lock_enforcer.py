@@ -0,0 +1,274 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import select
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+from lock_manager import LockManager
+
+class InotifyWatcher:
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        # Watch the directory, not the file: LockManager replaces the file, which changes its inode
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(os.path.dirname(path) or '.'), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch failed")
+        self.filename = os.fsencode(os.path.basename(path))
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        matched = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                if data[offset:offset + length].rstrip(b'\0') == self.filename:
+                    matched = True
+                offset += length
+        return matched
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    def __init__(self, path, interval=0.25):
+        self.path = path
+        self.interval = interval
+
+    def wait(self, timeout):
+        # LockManager.refresh() compares the file's stat signature, so just wake it periodically
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+def create_watcher(path, poll_interval=0.25):
+    if platform.system() == 'Linux':
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollingWatcher(path, poll_interval)
+
+class CommandLockScreen:
+    COMMANDS = {
+        'Windows': ['rundll32.exe', 'user32.dll,LockWorkStation'],
+        'Darwin': ['pmset', 'displaysleepnow'],
+        'Linux': ['loginctl', 'lock-session']
+    }
+
+    def lock(self, message):
+        command = self.COMMANDS.get(platform.system())
+        if not command:
+            print("No lock command for this platform")
+            return
+        subprocess.Popen(command)
+
+    def unlock(self):
+        # The OS lock screen is dismissed by the user signing in
+        pass
+
+class TkLockScreen:
+    def __init__(self):
+        import tkinter as tk
+
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.root.configure(bg="#000000")
+        self.root.protocol("WM_DELETE_WINDOW", lambda: None)
+        self.label = tk.Label(self.root, font=("Arial", 28, "bold"), bg="#000000", fg="#ff3333",
+                              justify=tk.CENTER, wraplength=900)
+        self.label.pack(expand=True)
+
+    def _show(self, message):
+        self.label.config(text=message or "This laptop has been locked by its owner.")
+        self.root.deiconify()
+        self.root.attributes('-fullscreen', True)
+        self.root.attributes('-topmost', True)
+        self.root.lift()
+        self.root.focus_force()
+
+    def lock(self, message):
+        # Called from the enforcer thread; Tk calls are marshalled onto the main loop
+        self.root.after(0, self._show, message)
+
+    def unlock(self):
+        self.root.after(0, self.root.withdraw)
+
+    def run(self):
+        self.root.mainloop()
+
+class FakeLockScreen:
+    def __init__(self):
+        self.locked = False
+        self.message = None
+        self.history = []
+        self.changed = threading.Condition()
+
+    def lock(self, message):
+        with self.changed:
+            self.locked = True
+            self.message = message
+            self.history.append(('lock', time.time()))
+            self.changed.notify_all()
+
+    def unlock(self):
+        with self.changed:
+            self.locked = False
+            self.history.append(('unlock', time.time()))
+            self.changed.notify_all()
+
+    def wait_for(self, locked, timeout=5):
+        with self.changed:
+            return self.changed.wait_for(lambda: self.locked == locked, timeout)
+
+class LockEnforcer:
+    def __init__(self, screen, lock_manager=None, watcher=None, poll_interval=0.25):
+        self.screen = screen
+        self.lock_manager = lock_manager or LockManager()
+        self.watcher = watcher or create_watcher(self.lock_manager.lock_file, poll_interval)
+        self.applied_version = None
+        self.latencies = deque(maxlen=1000)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock_manager.subscribe(self.apply)
+
+    def apply(self, state):
+        if state.get('version') == self.applied_version:
+            return
+        self.applied_version = state.get('version')
+        try:
+            if state.get('is_locked'):
+                self.screen.lock(state.get('lock_message', ''))
+            else:
+                self.screen.unlock()
+        except Exception as e:
+            print(f"Lock enforcement error: {e}")
+            return
+
+        # changed_at is the writer's wall clock, so this is file-write-to-enforcement latency
+        if state.get('changed_at'):
+            latency_ms = (time.time() - state['changed_at']) * 1000
+            self.latencies.append(latency_ms)
+            print(f"{'Lock' if state.get('is_locked') else 'Unlock'} enforced in {latency_ms:.1f} ms")
+
+    def run(self):
+        self.apply(self.lock_manager.get_state())
+        while not self.stop_event.is_set():
+            if self.watcher.wait(1.0):
+                self.lock_manager.refresh()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(2)
+            self.thread = None
+        self.lock_manager.unsubscribe(self.apply)
+        self.watcher.close()
+
+    def latency_stats(self):
+        samples = sorted(self.latencies)
+        if not samples:
+            return {'count': 0}
+        return {
+            'count': len(samples),
+            'last_ms': round(self.latencies[-1], 2),
+            'p50_ms': round(samples[len(samples) // 2], 2),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+            'max_ms': round(samples[-1], 2)
+        }
+
+
+def self_test(toggles=20, watcher_kind='auto', poll_interval=0.25):
+    import tempfile
+
+    data_dir = tempfile.mkdtemp()
+    writer = LockManager(data_dir)
+    reader = LockManager(data_dir)
+    watcher = None
+    if watcher_kind == 'poll':
+        watcher = PollingWatcher(reader.lock_file, poll_interval)
+    elif watcher_kind == 'inotify':
+        watcher = InotifyWatcher(reader.lock_file)
+
+    screen = FakeLockScreen()
+    enforcer = LockEnforcer(screen, reader, watcher, poll_interval)
+    enforcer.start()
+    failures = 0
+    try:
+        for i in range(toggles):
+            locked = i % 2 == 0
+            writer.set_lock_status(locked, f"self-test {i}" if locked else "")
+            if not screen.wait_for(locked):
+                failures += 1
+            elif locked and screen.message != f"self-test {i}":
+                failures += 1
+            time.sleep(0.02)
+    finally:
+        enforcer.stop()
+    return dict(enforcer.latency_stats(), watcher=type(enforcer.watcher).__name__, failures=failures)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Enforce remote lock commands on this device")
+    parser.add_argument('--backend', choices=['tk', 'command'], default='tk',
+                        help="tk shows a full-screen lock message; command locks the OS session")
+    parser.add_argument('--poll-interval', type=float, default=0.25,
+                        help="Polling interval when inotify is unavailable")
+    parser.add_argument('--self-test', type=int, metavar='TOGGLES',
+                        help="Toggle the lock against a fake lock screen and report enforcement latency")
+    parser.add_argument('--watcher', choices=['auto', 'inotify', 'poll'], default='auto')
+    args = parser.parse_args()
+
+    if args.self_test:
+        result = self_test(args.self_test, args.watcher, args.poll_interval)
+        print(json.dumps(result, indent=2))
+        raise SystemExit(1 if result['failures'] else 0)
+
+    if args.backend == 'tk':
+        screen = TkLockScreen()
+        enforcer = LockEnforcer(screen, poll_interval=args.poll_interval)
+        enforcer.start()
+        print("Lock enforcer running. Press Ctrl+C to stop.")
+        try:
+            screen.run()
+        finally:
+            enforcer.stop()
+    else:
+        enforcer = LockEnforcer(CommandLockScreen(), poll_interval=args.poll_interval)
+        print("Lock enforcer running. Press Ctrl+C to stop.")
+        try:
+            enforcer.run()
+        except KeyboardInterrupt:
+            pass
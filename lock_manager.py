@@ -1,49 +1,118 @@
 import json
 import os
+import tempfile
+import threading
+import time
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 class LockManager:
-    def __init__(self):
-        self.data_dir = "data"
+    def __init__(self, data_dir="data"):
+        self.data_dir = data_dir
         self.lock_file = os.path.join(self.data_dir, "lock_status.json")
         self.ensure_data_directory()
+        self.lock = threading.RLock()
+        self.state = {'is_locked': False, 'lock_message': '', 'timestamp': None, 'version': 0}
+        self.file_signature = None
+        self.subscribers = []
+        self.refresh()
     
     def ensure_data_directory(self):
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
     
-    def set_lock_status(self, is_locked, message=""):
+    def refresh(self):
+        # A stat per read; the file is only parsed when another process has replaced it
         try:
-            lock_data = {
-                'is_locked': is_locked,
-                'lock_message': message,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            with open(self.lock_file, 'w') as f:
+            stat = os.stat(self.lock_file)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        
+        with self.lock:
+            if signature == self.file_signature:
+                return False
+            state = {'is_locked': False, 'lock_message': '', 'timestamp': None, 'version': 0}
+            if signature is not None:
+                try:
+                    with open(self.lock_file, 'r') as f:
+                        state.update(json.load(f))
+                except Exception as e:
+                    print(f"Error reading lock status: {e}")
+                    return False
+            self.file_signature = signature
+            changed = state != self.state
+            self.state = state
+        
+        if changed:
+            self.notify(state)
+        return changed
+    
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+    
+    def notify(self, state):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(dict(state))
+            except Exception as e:
+                print(f"Lock subscriber error: {e}")
+    
+    def _write(self, lock_data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
                 json.dump(lock_data, f, indent=2)
+            os.replace(tmp_path, self.lock_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def set_lock_status(self, is_locked, message=""):
+        try:
+            with self.lock, open(self.lock_file + ".lock", 'a') as writer_lock:
+                # Serialize writers across processes so every change gets its own version number
+                if fcntl is not None:
+                    fcntl.flock(writer_lock, fcntl.LOCK_EX)
+                self.refresh()
+                lock_data = {
+                    'is_locked': is_locked,
+                    'lock_message': message,
+                    'timestamp': datetime.now().isoformat(),
+                    'changed_at': time.time(),
+                    'version': self.state.get('version', 0) + 1
+                }
+                self._write(lock_data)
+                self.refresh()
             
             return True
         except Exception as e:
             print(f"Error setting lock status: {e}")
             return False
     
+    def get_state(self):
+        self.refresh()
+        with self.lock:
+            return dict(self.state)
+    
+    def get_version(self):
+        return self.get_state()['version']
+    
     def is_locked(self):
-        try:
-            if os.path.exists(self.lock_file):
-                with open(self.lock_file, 'r') as f:
-                    data = json.load(f)
-                    return data.get('is_locked', False)
-        except:
-            pass
-        return False
+        return self.get_state().get('is_locked', False)
     
     def get_lock_message(self):
-        try:
-            if os.path.exists(self.lock_file):
-                with open(self.lock_file, 'r') as f:
-                    data = json.load(f)
-                    return data.get('lock_message', '')
-        except:
-            pass
-        return ''
+        return self.get_state().get('lock_message', '')
@@ -0,0 +1,143 @@
+import os
+import time
+import numpy as np
+
+class MotionDetector:
+    GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+    def __init__(self, sensitivity=0.02, threshold=25, alpha=0.05, width=160, frame_budget_ms=5.0):
+        # sensitivity is the fraction of downscaled pixels that must change to count as motion
+        self.sensitivity = sensitivity
+        self.threshold = threshold
+        self.alpha = alpha
+        self.width = width
+        self.frame_budget_ms = frame_budget_ms
+        self.background = None
+        self.step = None
+        self.base_step = None
+        self.avg_cost_ms = 0.0
+        self.last_score = 0.0
+
+    def reset(self):
+        self.background = None
+        self.step = None
+        self.base_step = None
+        self.avg_cost_ms = 0.0
+        self.last_score = 0.0
+
+    def _prepare(self, frame):
+        if self.step is None:
+            self.base_step = max(1, frame.shape[1] // self.width)
+            self.step = self.base_step
+        small = frame[::self.step, ::self.step]
+        if small.ndim == 3:
+            return small[..., :3].astype(np.float32) @ self.GRAY_WEIGHTS
+        return small.astype(np.float32)
+
+    def _adapt(self, cost_ms):
+        self.avg_cost_ms = 0.8 * self.avg_cost_ms + 0.2 * cost_ms if self.avg_cost_ms else cost_ms
+        if self.avg_cost_ms > self.frame_budget_ms:
+            self.step += 1
+            self.background = None
+            self.avg_cost_ms = 0.0
+        elif self.step > self.base_step and self.avg_cost_ms < self.frame_budget_ms / 4:
+            self.step -= 1
+            self.background = None
+            self.avg_cost_ms = 0.0
+
+    def update(self, frame):
+        start = time.perf_counter()
+        gray = self._prepare(frame)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            self.last_score = 0.0
+            return False
+
+        diff = np.abs(gray - self.background)
+        self.background += self.alpha * (gray - self.background)
+        self.last_score = float(np.count_nonzero(diff > self.threshold)) / diff.size
+
+        self._adapt((time.perf_counter() - start) * 1000)
+        return self.last_score >= self.sensitivity
+
+
+def load_frames(path, limit=None):
+    import cv2
+
+    frames = []
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            frame = cv2.imread(os.path.join(path, filename))
+            if frame is not None:
+                frames.append(frame)
+            if limit and len(frames) >= limit:
+                break
+        return frames
+
+    cap = cv2.VideoCapture(path)
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+        if limit and len(frames) >= limit:
+            break
+    cap.release()
+    return frames
+
+
+def synthetic_frames(count=300, width=1280, height=720, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        noise = rng.integers(-4, 5, frame.shape, dtype=np.int16)
+        frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if 100 <= i < 160:
+            x = (i - 100) * (width // 80)
+            frame[height // 3:2 * height // 3, x:x + width // 6] = 30
+        frames.append(frame)
+    return frames
+
+
+def benchmark(frames, **kwargs):
+    detector = MotionDetector(**kwargs)
+    costs = []
+    motion_frames = 0
+    for frame in frames:
+        start = time.perf_counter()
+        if detector.update(frame):
+            motion_frames += 1
+        costs.append((time.perf_counter() - start) * 1000)
+
+    costs = np.array(costs) if costs else np.zeros(1)
+    return {
+        'frames': len(frames),
+        'motion_frames': motion_frames,
+        'mean_ms': round(float(costs.mean()), 3),
+        'p95_ms': round(float(np.percentile(costs, 95)), 3),
+        'max_ms': round(float(costs.max()), 3),
+        'budget_ms': detector.frame_budget_ms,
+        'final_step': detector.step
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark motion detection on a recorded frame sequence")
+    parser.add_argument('path', nargs='?', help="Video file or directory of frames (synthetic frames if omitted)")
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--sensitivity', type=float, default=0.02)
+    parser.add_argument('--threshold', type=int, default=25)
+    parser.add_argument('--width', type=int, default=160)
+    parser.add_argument('--budget-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    frames = load_frames(args.path, args.limit) if args.path else synthetic_frames()
+    result = benchmark(frames, sensitivity=args.sensitivity, threshold=args.threshold,
+                       width=args.width, frame_budget_ms=args.budget_ms)
+    print(json.dumps(result, indent=2))
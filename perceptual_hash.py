@@ -0,0 +1,58 @@
+import os
+from collections import deque
+import cv2
+import numpy as np
+
+# Only kinds listed here are deduplicated. Screenshots are left out on purpose: a few lines of new text barely
+# move a whole-frame hash, and the tile-delta recorder already stores repeated screens cheaply.
+# (max differing dHash bits out of 256, max per-cell brightness change out of 255)
+DEFAULT_THRESHOLDS = {'webcam': (16, 12)}
+
+def dhash(image, hash_size=16):
+    thumb = cv2.resize(np.asarray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    thumb = thumb.astype(np.float32)
+    if thumb.ndim == 3:
+        thumb = thumb[..., :3].mean(axis=2)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def cell_means(image, size=(32, 24)):
+    # Mean brightness per cell: catches a small new object or a brightness change that dHash ignores
+    cells = cv2.resize(np.asarray(image), size, interpolation=cv2.INTER_AREA).astype(np.int16)
+    return cells[..., :3].mean(axis=2).astype(np.int16) if cells.ndim == 3 else cells
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+class DuplicateFilter:
+    def __init__(self, thresholds=None, history=16):
+        self.thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+        self.history = history
+        self.recent = {}
+        self.suppressed = 0
+
+    def find_duplicate(self, fingerprint, kind):
+        max_bits, max_cell_change = self.thresholds[kind]
+        image_hash, cells = fingerprint
+        for (previous_hash, previous_cells), path in self.recent.get(kind, ()):
+            if hamming_distance(image_hash, previous_hash) > max_bits or previous_cells.shape != cells.shape:
+                continue
+            if np.abs(cells - previous_cells).max() <= max_cell_change and os.path.exists(path):
+                return path
+        return None
+
+    def check(self, image, kind):
+        if kind not in self.thresholds:
+            return None, None
+        fingerprint = (dhash(image), cell_means(image))
+        duplicate_of = self.find_duplicate(fingerprint, kind)
+        if duplicate_of:
+            self.suppressed += 1
+        return fingerprint, duplicate_of
+
+    def add(self, fingerprint, path, kind):
+        if fingerprint is None:
+            return
+        if kind not in self.recent:
+            self.recent[kind] = deque(maxlen=self.history)
+        self.recent[kind].appendleft((fingerprint, path))
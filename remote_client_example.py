@@ -1,14 +1,71 @@
 import requests
 import json
+import time
+
+class BatchBuilder:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def add(self, action, **params):
+        self.commands.append(dict(params, action=action))
+        return self
+    
+    def status(self):
+        return self.add('status')
+    
+    def device_info(self):
+        return self.add('device_info')
+    
+    def lock(self, message=None):
+        return self.add('lock', message=message) if message else self.add('lock')
+    
+    def unlock(self):
+        return self.add('unlock')
+    
+    def alarm(self, duration=30, pattern='tone'):
+        return self.add('alarm', duration=duration, pattern=pattern)
+    
+    def stop_alarm(self):
+        return self.add('alarm_stop')
+    
+    def alarm_status(self):
+        return self.add('alarm_status')
+    
+    def location(self):
+        return self.add('location')
+    
+    def capture(self):
+        return self.add('capture')
+    
+    def logs(self, count=20):
+        return self.add('logs', count=count)
+    
+    def send(self):
+        return self.client.run_batch(self.commands)
 
 class AntiTheftRemoteClient:
     def __init__(self, server_url, api_key):
         self.server_url = server_url.rstrip('/')
         self.headers = {'X-API-Key': api_key, 'Content-Type': 'application/json'}
+        self.cache = {}
+    
+    def get_cached(self, path, params=None):
+        # Sends the last ETag back; on 304 the server skipped building the payload and the cached copy is reused
+        key = (path, tuple(sorted((params or {}).items())))
+        headers = dict(self.headers)
+        if key in self.cache:
+            headers['If-None-Match'] = self.cache[key][0]
+        response = requests.get(f"{self.server_url}{path}", headers=headers, params=params)
+        if response.status_code == 304 and key in self.cache:
+            return self.cache[key][1]
+        result = response.json()
+        if response.status_code == 200 and response.headers.get('ETag'):
+            self.cache[key] = (response.headers['ETag'], result)
+        return result
     
     def get_status(self):
-        response = requests.get(f"{self.server_url}/api/status", headers=self.headers)
-        return response.json()
+        return self.get_cached("/api/status")
     
     def lock_device(self, message=None):
         data = {'message': message} if message else {}
@@ -20,28 +77,111 @@ class AntiTheftRemoteClient:
         response = requests.post(f"{self.server_url}/api/unlock", headers=self.headers)
         return response.json()
     
-    def get_location(self):
-        response = requests.get(f"{self.server_url}/api/location", headers=self.headers)
-        return response.json()
+    def get_location(self, wait=10):
+        response = requests.get(f"{self.server_url}/api/location", headers=self.headers,
+                                params={'wait': wait})
+        result = response.json()
+        if response.status_code == 202:
+            job = self.wait_for_job(result['job_id'])
+            result = dict(job.get('result') or {}, success=job['status'] == 'succeeded', job=job)
+        return result
     
-    def trigger_alarm(self, duration=30):
-        data = {'duration': duration}
+    def trigger_alarm(self, duration=30, pattern='tone'):
+        data = {'duration': duration, 'pattern': pattern}
         response = requests.post(f"{self.server_url}/api/alarm", 
                                 headers=self.headers, json=data)
         return response.json()
     
+    def stop_alarm(self):
+        response = requests.post(f"{self.server_url}/api/alarm/stop", headers=self.headers)
+        return response.json()
+    
+    def get_alarm_status(self):
+        response = requests.get(f"{self.server_url}/api/alarm/status", headers=self.headers)
+        return response.json()
+    
+    def get_metrics(self, seconds=3600, points=120):
+        response = requests.get(f"{self.server_url}/api/metrics", headers=self.headers,
+                                params={'seconds': seconds, 'points': points})
+        return response.json()
+    
+    def enroll_device(self, name=None, device_id=None):
+        data = {'name': name, 'device_id': device_id}
+        response = requests.post(f"{self.server_url}/api/fleet/devices", headers=self.headers, json=data)
+        return response.json()
+    
+    def rotate_device_key(self, device_id):
+        response = requests.post(f"{self.server_url}/api/fleet/devices/{device_id}/rotate", headers=self.headers)
+        return response.json()
+    
+    def list_fleet_evidence(self, device_id, offset=0, limit=50):
+        response = requests.get(f"{self.server_url}/api/fleet/devices/{device_id}/evidence", headers=self.headers,
+                                params={'offset': offset, 'limit': limit})
+        return response.json()
+    
+    def download_fleet_evidence(self, device_id, evidence_id, output_path):
+        response = requests.get(f"{self.server_url}/api/fleet/devices/{device_id}/evidence/{evidence_id}",
+                                headers=self.headers, stream=True)
+        response.raise_for_status()
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        return output_path
+    
+    def list_fleet_devices(self, offset=0, limit=50):
+        response = requests.get(f"{self.server_url}/api/fleet/devices", headers=self.headers,
+                                params={'offset': offset, 'limit': limit})
+        return response.json()
+    
     def capture_evidence(self):
         response = requests.post(f"{self.server_url}/api/capture", headers=self.headers)
         return response.json()
     
-    def get_logs(self, count=20):
-        response = requests.get(f"{self.server_url}/api/logs?count={count}", 
-                               headers=self.headers)
+    def capture_clip(self, seconds=10, fps=10, width=640, height=480):
+        data = {'mode': 'clip', 'seconds': seconds, 'fps': fps, 'width': width, 'height': height}
+        response = requests.post(f"{self.server_url}/api/capture", 
+                                headers=self.headers, json=data)
         return response.json()
     
-    def get_device_info(self):
-        response = requests.get(f"{self.server_url}/api/device-info", headers=self.headers)
+    def capture_on_motion(self, count=3, interval=2, timeout=60, screenshot_mode='full'):
+        data = {'mode': 'motion', 'count': count, 'interval': interval, 'timeout': timeout,
+                'screenshot_mode': screenshot_mode}
+        response = requests.post(f"{self.server_url}/api/capture", 
+                                headers=self.headers, json=data)
         return response.json()
+    
+    def get_job(self, job_id, wait=0):
+        response = requests.get(f"{self.server_url}/api/jobs/{job_id}", headers=self.headers,
+                                params={'wait': wait})
+        return response.json()
+    
+    def wait_for_job(self, job_id, timeout=120):
+        deadline = time.time() + timeout
+        while True:
+            job = self.get_job(job_id, wait=min(10, max(0, deadline - time.time()))).get('job')
+            if job is None or job['status'] in ('succeeded', 'failed') or time.time() >= deadline:
+                return job
+    
+    def batch(self):
+        return BatchBuilder(self)
+    
+    def run_batch(self, commands, wait=10):
+        response = requests.post(f"{self.server_url}/api/batch", headers=self.headers,
+                                 json={'commands': commands}, params={'wait': wait})
+        result = response.json()
+        if response.status_code == 202:
+            job = self.wait_for_job(result['job_id'])
+            result = dict(job.get('result') or {'success': False, 'results': result['results']}, job=job)
+        return result
+    
+    def report_stolen(self, message=None, alarm_duration=60):
+        return self.batch().lock(message).alarm(alarm_duration, 'siren').capture().location().logs().send()
+    
+    def get_logs(self, count=20):
+        return self.get_cached("/api/logs", {'count': count})
+    
+    def get_device_info(self):
+        return self.get_cached("/api/device-info")
 
 if __name__ == "__main__":
     SERVER_URL = "http://your-device-ip:5000"
@@ -58,8 +198,9 @@ if __name__ == "__main__":
     print("6. Capture Evidence")
     print("7. Get Logs")
     print("8. Get Device Info")
+    print("9. Report Stolen (lock, alarm, capture, location and logs in one request)")
     
-    choice = input("\nSelect an option (1-8): ")
+    choice = input("\nSelect an option (1-9): ")
     
     try:
         if choice == "1":
@@ -83,12 +224,15 @@ if __name__ == "__main__":
         elif choice == "5":
             duration = input("Enter alarm duration in seconds (default 30): ")
             duration = int(duration) if duration else 30
-            result = client.trigger_alarm(duration)
+            pattern = input("Enter alarm pattern - tone, siren, pulse, two_tone, chirp (default tone): ")
+            result = client.trigger_alarm(duration, pattern or 'tone')
             print(f"\nAlarm Result:\n{json.dumps(result, indent=2)}")
         
         elif choice == "6":
             print("Capturing evidence...")
             result = client.capture_evidence()
+            if result.get('job_id'):
+                result = client.wait_for_job(result['job_id'])
             print(f"\nCapture Result:\n{json.dumps(result, indent=2)}")
         
         elif choice == "7":
@@ -101,6 +245,11 @@ if __name__ == "__main__":
             result = client.get_device_info()
             print(f"\nDevice Info:\n{json.dumps(result, indent=2)}")
         
+        elif choice == "9":
+            message = input("Enter lock message (or press Enter for default): ")
+            result = client.report_stolen(message if message else None)
+            print(f"\nReport Result:\n{json.dumps(result, indent=2)}")
+        
         else:
             print("Invalid choice!")
     
@@ -1,13 +1,25 @@
-from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for
+from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_file, Response
 import os
+import math
+import mimetypes
 from api_auth_manager import APIAuthManager
 from auth_manager import AuthManager
 from device_manager import DeviceManager
 from location_tracker import LocationTracker
 from evidence_capture import EvidenceCapture
-from alarm_system import AlarmSystem
+from alarm_controller import AlarmController
+from alarm_patterns import PATTERNS, DEFAULT_PATTERN
 from event_logger import EventLogger
+from lock_manager import LockManager
+from telemetry import TelemetrySampler
+from fleet_registry import FleetRegistry, DeviceExistsError, EvidenceTooLargeError
+from thumbnail_cache import ThumbnailCache
+from evidence_crypto import EncryptedReader
+from job_queue import JobQueue, JobQueueFull
+from event_stream import EventBroker
 import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
@@ -26,12 +38,143 @@ auth_manager = AuthManager()
 device_manager = DeviceManager()
 location_tracker = LocationTracker()
 evidence_capture = EvidenceCapture()
-alarm_system = AlarmSystem()
+alarm_system = AlarmController()
+lock_manager = LockManager()
+fleet_registry = FleetRegistry(os.environ.get('FLEET_DIR', "data/fleet"))
+telemetry = TelemetrySampler(interval=float(os.environ.get('TELEMETRY_INTERVAL', 5)),
+                             shared_file="data/telemetry.bin")
 event_logger = EventLogger()
+thumbnail_cache = ThumbnailCache(thumb_dir=evidence_capture.store.thumbs_dir, key=evidence_capture.store.key)
+job_queue = JobQueue(workers=int(os.environ.get('JOB_WORKERS', 4)),
+                     max_pending=int(os.environ.get('JOB_QUEUE_SIZE', 32)))
+event_broker = EventBroker()
+
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+# Well below gunicorn's worker timeout, so a waiting request never gets its worker killed
+MAX_JOB_WAIT = 10
+MAX_BATCH_COMMANDS = 20
+MAX_ALARM_DURATION = 300
+FLEET_MAX_EVIDENCE_BYTES = int(os.environ.get('FLEET_MAX_EVIDENCE_BYTES', 100 * 1024 * 1024))
+BATCH_ACTIONS = ('status', 'device_info', 'lock', 'unlock', 'alarm', 'alarm_stop', 'alarm_status',
+                 'location', 'capture', 'logs')
+SLOW_BATCH_ACTIONS = {'lock', 'alarm', 'location', 'capture'}
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def valid_alarm_duration(duration):
+    # The mixer's timer has millisecond resolution; shorter durations would round down to "no limit"
+    return is_number(duration) and 0.001 <= duration <= MAX_ALARM_DURATION
 
 def verify_api_key(api_key):
     return api_auth.verify_api_key(api_key)
 
+def prefetch_thumbnails(count=100, reconcile=False):
+    def prefetch():
+        if reconcile:
+            evidence_capture.reconcile_evidence()
+        thumbnail_cache.prefetch(evidence_capture.store.list_records(limit=count))
+    
+    thread = threading.Thread(target=prefetch)
+    thread.daemon = True
+    thread.start()
+
+def state_etag(name):
+    # The owner name comes from the API credentials, so re-registering the owner changes the tag too
+    return f"{name}-{lock_manager.get_version()}-{telemetry.count}-{api_auth.get_version()}"
+
+def logs_etag(count):
+    return f"logs-{event_logger.get_last_event_id()}-{count}"
+
+def conditional_json(etag, build):
+    # The validator is checked before build() runs, so an unchanged resource costs a couple of stat calls
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def job_response(job, payload=None):
+    # Clients may pass ?wait=<seconds> to get the result inline when the job finishes quickly
+    wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_JOB_WAIT)
+    if wait:
+        job = job_queue.wait(job['id'], wait) or job
+    
+    body = dict(payload or {}, success=True, job_id=job['id'],
+                status_url=url_for('get_job', job_id=job['id']), job=job)
+    if job['status'] == 'succeeded':
+        body.update(job['result'] or {})
+        return jsonify(body)
+    if job['status'] == 'failed':
+        body.update(success=False, error=job['error'])
+        return jsonify(body), 500
+    return jsonify(body), 202
+
+@app.errorhandler(JobQueueFull)
+def job_queue_full(error):
+    response = jsonify({'error': 'Too many pending jobs, retry later', 'retry_after': error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def evidence_summary(record):
+    return {
+        'id': record['id'],
+        'filename': record['filename'],
+        'kind': record['kind'],
+        'size': record['size'],
+        'created': record['created'],
+        'faces': (record.get('meta') or {}).get('faces'),
+        'download_url': url_for('download_evidence', evidence_id=record['id']),
+        'thumb_url': (url_for('get_evidence_thumbnail', evidence_id=record['id'])
+                      if thumbnail_cache.is_supported(record) else None)
+    }
+
+def send_encrypted_file(path, key, etag, download_name, as_attachment=False, max_age=0, mimetype=None):
+    # send_file cannot serve encrypted blobs, so Range and ETag handling is done here;
+    # only the chunks overlapping the requested range are decrypted
+    reader = EncryptedReader(path, key)
+    size = reader.size
+    
+    if request.if_none_match.contains(etag):
+        reader.close()
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    start, stop, status = 0, size, 200
+    byte_range = request.range
+    # Multipart byte ranges aren't supported; like send_file, answer those with the whole file
+    if (byte_range and len(byte_range.ranges) == 1
+            and ('If-Range' not in request.headers or request.if_range.etag == etag)):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            reader.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = bounds
+        status = 206
+    
+    def generate():
+        try:
+            yield from reader.iter_range(start, stop)
+        finally:
+            reader.close()
+    
+    response = Response(generate(), status=status, direct_passthrough=True,
+                        mimetype=mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+    response.content_length = stop - start
+    response.accept_ranges = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    response.set_etag(etag)
+    response.cache_control.max_age = max_age
+    response.headers['Content-Disposition'] = f'{"attachment" if as_attachment else "inline"}; filename="{download_name}"'
+    return response
+
 def is_web_authenticated():
     return session.get('authenticated', False)
 
@@ -65,10 +208,7 @@ def web_dashboard():
         return redirect(url_for('web_login'))
     
     user_data = auth_manager.get_user_data()
-    device_info = device_manager.get_device_info()
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
+    device_info = device_manager.get_device_info(telemetry.latest())
     return render_template_string(DASHBOARD_PAGE, 
                                  user=user_data,
                                  device_id=device_manager.get_device_id(),
@@ -80,46 +220,44 @@ def web_action_lock():
     if not is_web_authenticated():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
     message = request.json.get('message', '')
     if not message:
         user_data = auth_manager.get_user_data()
         if user_data:
             message = f"This laptop is stolen!\n\nOwner: {user_data.get('name')}\nContact: {user_data.get('contact')}\n\nPlease contact owner for reward!"
     
-    success = lock_manager.set_lock_status(True, message)
-    if success:
-        event_logger.log_event("WEB_LOCK", "Device locked via web dashboard", 
-                              include_location=True, include_evidence=True)
-    
-    return jsonify({'success': success})
+    with job_queue.reserve() as submit:
+        success = lock_manager.set_lock_status(True, message)
+        if not success:
+            return jsonify({'success': False})
+        
+        job = submit('lock', lambda: {'event': event_logger.log_event(
+            "WEB_LOCK", "Device locked via web dashboard", include_location=True, include_evidence=True)})
+    return jsonify({'success': True, 'job_id': job['id']})
 
 @app.route('/web/action/unlock', methods=['POST'])
 def web_action_unlock():
     if not is_web_authenticated():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
     success = lock_manager.set_lock_status(False, "")
     if success:
         event_logger.log_event("WEB_UNLOCK", "Device unlocked via web dashboard")
     
     return jsonify({'success': success})
 
+def check_location(event_type, description):
+    # One lookup per request: the event records the location and the job returns the same data
+    event = event_logger.log_event(event_type, description, include_location=True)
+    return {'location': event.get('location'), 'event_id': event['event_id']}
+
 @app.route('/web/action/location', methods=['GET'])
 def web_action_location():
     if not is_web_authenticated():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    location_data = location_tracker.get_current_location()
-    event_logger.log_event("WEB_LOCATION", "Location checked via web dashboard", 
-                          include_location=True)
-    
-    return jsonify({'success': True, 'location': location_data})
+    return job_response(job_queue.submit('location', check_location, "WEB_LOCATION",
+                                         "Location checked via web dashboard"))
 
 @app.route('/web/action/alarm', methods=['POST'])
 def web_action_alarm():
@@ -127,27 +265,39 @@ def web_action_alarm():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
     duration = request.json.get('duration', 30)
-    alarm_system.play_alarm(duration)
-    event_logger.log_event("WEB_ALARM", f"Alarm triggered via web dashboard ({duration}s)", 
-                          include_location=True, include_evidence=True)
+    pattern = request.json.get('pattern', DEFAULT_PATTERN)
+    if pattern not in PATTERNS:
+        return jsonify({'success': False, 'error': f'Unknown alarm pattern: {pattern}'}), 400
+    if not valid_alarm_duration(duration):
+        return jsonify({'success': False,
+                        'error': f'Duration must be from 0.001 to {MAX_ALARM_DURATION} seconds'}), 400
+    
+    with job_queue.reserve() as submit:
+        try:
+            alarm_system.play_alarm(duration, pattern)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
+        job = submit('alarm', lambda: {'event': event_logger.log_event(
+            "WEB_ALARM", f"Alarm triggered via web dashboard ({duration}s, {pattern})",
+            include_location=True, include_evidence=True)})
     
-    return jsonify({'success': True, 'message': f'Alarm triggered for {duration} seconds'})
+    return jsonify({'success': True, 'message': f'Alarm triggered for {duration} seconds', 'pattern': pattern,
+                    'job_id': job['id']})
 
 @app.route('/web/action/capture', methods=['POST'])
 def web_action_capture():
     if not is_web_authenticated():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    def capture_async():
-        evidence_capture.capture_evidence_set()
-        event_logger.log_event("WEB_CAPTURE", "Evidence captured via web dashboard", 
-                              include_evidence=True)
+    def capture():
+        event = event_logger.log_event("WEB_CAPTURE", "Evidence captured via web dashboard", 
+                                       include_evidence=True)
+        prefetch_thumbnails(4)
+        return {'event': event}
     
-    thread = threading.Thread(target=capture_async)
-    thread.daemon = True
-    thread.start()
+    job = job_queue.submit('capture', capture)
     
-    return jsonify({'success': True, 'message': 'Evidence capture initiated'})
+    return jsonify({'success': True, 'message': 'Evidence capture initiated', 'job_id': job['id']})
 
 @app.route('/web/action/logs', methods=['GET'])
 def web_action_logs():
@@ -155,18 +305,15 @@ def web_action_logs():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
     count = request.args.get('count', 20, type=int)
-    events = event_logger.get_recent_events(count)
     
-    return jsonify({'success': True, 'events': events})
+    return conditional_json(logs_etag(count), lambda: {'success': True, 'events': event_logger.get_recent_events(count)})
 
 @app.route('/web/action/status', methods=['GET'])
 def web_action_status():
     if not is_web_authenticated():
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    device_info = device_manager.get_device_info()
+    device_info = device_manager.get_device_info(telemetry.latest())
     user_data = auth_manager.get_user_data()
     
     return jsonify({
@@ -183,18 +330,25 @@ def get_status():
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
+    return conditional_json(state_etag('status'), status_payload)
+
+def status_payload():
     user_info = api_auth.get_user_info()
-    device_info = device_manager.get_device_info()
+    device_info = device_manager.get_device_info(telemetry.latest())
     
-    return jsonify({
+    return {
         'device_id': device_manager.get_device_id(),
         'is_locked': lock_manager.is_locked(),
         'owner': user_info.get('name') if user_info else 'Unknown',
-        'system': device_info
-    })
+        'system': device_info,
+        'usage': telemetry.latest()
+    }
+
+def default_lock_message():
+    user_info = api_auth.get_user_info()
+    if user_info:
+        return f"This laptop is stolen!\n\nOwner: {user_info.get('name')}\n\nPlease contact owner for reward!"
+    return ''
 
 @app.route('/api/lock', methods=['POST'])
 def lock_device():
@@ -202,24 +356,18 @@ def lock_device():
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
     data = request.json or {}
-    message = data.get('message', '')
-    
-    if not message:
-        user_info = api_auth.get_user_info()
-        if user_info:
-            message = f"This laptop is stolen!\n\nOwner: {user_info.get('name')}\n\nPlease contact owner for reward!"
+    message = data.get('message', '') or default_lock_message()
     
-    success = lock_manager.set_lock_status(True, message)
+    # The lock itself is applied immediately; location and evidence are gathered by a job
+    with job_queue.reserve() as submit:
+        success = lock_manager.set_lock_status(True, message)
+        if success:
+            job = submit('lock', lambda: {'event': event_logger.log_event(
+                "REMOTE_LOCK", "Device locked via remote API", include_location=True, include_evidence=True)})
     
     if success:
-        event_logger.log_event("REMOTE_LOCK", "Device locked via remote API", 
-                              include_location=True, include_evidence=True)
-        return jsonify({
-            'success': True,
+        return job_response(job, {
             'message': 'Device locked successfully',
             'device_id': device_manager.get_device_id()
         })
@@ -232,9 +380,6 @@ def unlock_device():
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
-    
     success = lock_manager.set_lock_status(False, "")
     
     if success:
@@ -252,14 +397,8 @@ def get_location():
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    location_data = location_tracker.get_current_location()
-    event_logger.log_event("REMOTE_LOCATION_CHECK", "Location checked via remote API", 
-                          include_location=True)
-    
-    return jsonify({
-        'success': True,
-        'location': location_data
-    })
+    return job_response(job_queue.submit('location', check_location, "REMOTE_LOCATION_CHECK",
+                                         "Location checked via remote API"))
 
 @app.route('/api/alarm', methods=['POST'])
 def trigger_alarm():
@@ -269,36 +408,206 @@ def trigger_alarm():
     
     data = request.json or {}
     duration = data.get('duration', 30)
+    pattern = data.get('pattern', DEFAULT_PATTERN)
+    if pattern not in PATTERNS:
+        return jsonify({'error': f'Unknown alarm pattern: {pattern}', 'patterns': list(PATTERNS)}), 400
+    if not valid_alarm_duration(duration):
+        return jsonify({'error': f'Duration must be from 0.001 to {MAX_ALARM_DURATION} seconds'}), 400
     
-    alarm_system.play_alarm(duration)
-    event_logger.log_event("REMOTE_ALARM", f"Alarm triggered via remote API ({duration}s)", 
-                          include_location=True, include_evidence=True)
+    with job_queue.reserve() as submit:
+        try:
+            alarm_system.play_alarm(duration, pattern)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 503
+        job = submit('alarm', lambda: {'event': event_logger.log_event(
+            "REMOTE_ALARM", f"Alarm triggered via remote API ({duration}s, {pattern})",
+            include_location=True, include_evidence=True)})
     
-    return jsonify({
-        'success': True,
-        'message': f'Alarm triggered for {duration} seconds'
+    return job_response(job, {
+        'message': f'Alarm triggered for {duration} seconds',
+        'pattern': pattern
     })
 
+@app.route('/api/alarm/stop', methods=['POST'])
+def stop_alarm():
+    api_key = request.headers.get('X-API-Key')
+    if not verify_api_key(api_key):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        status = alarm_system.stop_alarm()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
+    event_logger.log_event("REMOTE_ALARM_STOPPED", "Alarm stopped via remote API")
+    
+    return jsonify({'success': True, 'alarm': status})
+
+@app.route('/api/alarm/status', methods=['GET'])
+def alarm_status():
+    api_key = request.headers.get('X-API-Key')
+    if not verify_api_key(api_key):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        return jsonify({'success': True, 'alarm': alarm_system.status()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
+
 @app.route('/api/capture', methods=['POST'])
 def capture_evidence():
     api_key = request.headers.get('X-API-Key')
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    def capture_async():
-        result = evidence_capture.capture_evidence_set()
-        event_logger.log_event("REMOTE_CAPTURE", "Evidence captured via remote API", 
-                              include_evidence=True)
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', request.args.get('mode', 'photo'))
+    if mode not in ('photo', 'clip', 'motion'):
+        return jsonify({'error': f'Unknown capture mode: {mode}'}), 400
+    screenshot_mode = data.get('screenshot_mode', 'full')
+    if screenshot_mode not in ('full', 'delta'):
+        return jsonify({'error': f'Unknown screenshot mode: {screenshot_mode}'}), 400
     
-    thread = threading.Thread(target=capture_async)
-    thread.daemon = True
-    thread.start()
+    try:
+        seconds = float(data.get('seconds', 10))
+        if not math.isfinite(seconds):
+            raise ValueError(seconds)
+        seconds = min(max(seconds, 1), 60)
+        fps = min(max(int(data.get('fps', 10)), 1), 30)
+        resolution = (min(max(int(data.get('width', 640)), 160), 1920),
+                      min(max(int(data.get('height', 480)), 120), 1080))
+        count = min(max(int(data.get('count', 3)), 1), 10)
+        interval = float(data.get('interval', 2))
+        timeout = float(data.get('timeout', 60))
+        if not (math.isfinite(interval) and math.isfinite(timeout)):
+            raise ValueError(interval, timeout)
+        interval = min(max(interval, 0.5), 60)
+        timeout = min(max(timeout, 1), 300)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'seconds, fps, width, height, count, interval and timeout must be numbers'}), 400
+    
+    def capture():
+        if mode == 'clip':
+            clip = evidence_capture.capture_video_clip(seconds, fps, resolution)
+            if not clip:
+                raise RuntimeError("Video clip capture failed")
+            event = event_logger.log_event("REMOTE_CAPTURE", f"Video clip captured via remote API ({seconds:g}s)", 
+                                           evidence=clip)
+            return {'event': event}
+        
+        if mode == 'motion':
+            # Watches the webcam and captures only when something moves, so a still room produces nothing
+            captured = evidence_capture.capture_multiple_photos(count, interval, motion_gated=True, timeout=timeout,
+                                                                screenshot_mode=screenshot_mode)
+            events = [event_logger.log_event("REMOTE_MOTION_CAPTURE",
+                                             f"Motion captured via remote API (score {result['motion_score']})",
+                                             evidence=result)
+                      for result in captured]
+            prefetch_thumbnails(4)
+            return {'events': events, 'captured': len(events)}
+        
+        event = event_logger.log_event("REMOTE_CAPTURE", "Evidence captured via remote API", 
+                                       include_evidence=True)
+        prefetch_thumbnails(4)
+        return {'event': event}
+    
+    return job_response(job_queue.submit('capture', capture), {
+        'mode': mode,
+        'message': {'clip': 'Video clip capture initiated',
+                    'motion': 'Waiting for motion'}.get(mode, 'Evidence capture initiated')
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if not verify_api_key(request.headers.get('X-API-Key')) and not is_web_authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_JOB_WAIT)
+    job = job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
+def lock_stream_payload(state):
+    return {
+        'is_locked': state.get('is_locked', False),
+        'lock_message': state.get('lock_message', ''),
+        'version': state.get('version', 0)
+    }
+
+def replay_lock(after):
+    state = lock_manager.get_state()
+    return [lock_stream_payload(state)] if state.get('version', 0) > after else []
+
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    if not verify_api_key(request.headers.get('X-API-Key')) and not is_web_authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    return Response(event_broker.stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/evidence', methods=['GET'])
+def list_evidence():
+    if not verify_api_key(request.headers.get('X-API-Key')) and not is_web_authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    records = evidence_capture.store.list_records(offset, limit)
     
     return jsonify({
         'success': True,
-        'message': 'Evidence capture initiated'
+        'total': evidence_capture.count_evidence_files(),
+        'offset': offset,
+        'limit': limit,
+        'evidence': [evidence_summary(record) for record in records]
     })
 
+@app.route('/api/evidence/<evidence_id>', methods=['GET'])
+def download_evidence(evidence_id):
+    if not verify_api_key(request.headers.get('X-API-Key')) and not is_web_authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    record = evidence_capture.store.get(evidence_id)
+    if not record or not os.path.exists(record['path']):
+        return jsonify({'error': 'Evidence not found'}), 404
+    
+    as_attachment = request.args.get('download', type=int) == 1
+    if record.get('encrypted'):
+        return send_encrypted_file(record['path'], evidence_capture.store.key, record['id'],
+                                   record['filename'], as_attachment=as_attachment)
+    
+    # send_file streams through wsgi.file_wrapper (sendfile under gunicorn) and handles
+    # Range, If-Range and If-None-Match itself when conditional=True
+    return send_file(os.path.abspath(record['path']), conditional=True, etag=record['id'],
+                     as_attachment=as_attachment, download_name=record['filename'], max_age=0)
+
+@app.route('/api/evidence/<evidence_id>/thumb', methods=['GET'])
+def get_evidence_thumbnail(evidence_id):
+    if not verify_api_key(request.headers.get('X-API-Key')) and not is_web_authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    record = evidence_capture.store.get(evidence_id)
+    if not record or not os.path.exists(record['path']):
+        return jsonify({'error': 'Evidence not found'}), 404
+    
+    thumb_path = thumbnail_cache.get_thumbnail(record)
+    if not thumb_path:
+        return jsonify({'error': 'No preview available for this evidence'}), 404
+    
+    if record.get('encrypted'):
+        response = send_encrypted_file(thumb_path, evidence_capture.store.key, thumbnail_cache.cache_key(record),
+                                       os.path.basename(thumb_path), max_age=THUMBNAIL_MAX_AGE, mimetype='image/jpeg')
+    else:
+        response = send_file(os.path.abspath(thumb_path), mimetype='image/jpeg', conditional=True,
+                             etag=thumbnail_cache.cache_key(record), max_age=THUMBNAIL_MAX_AGE)
+    response.headers['Cache-Control'] = f'private, max-age={THUMBNAIL_MAX_AGE}, immutable'
+    return response
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
     api_key = request.headers.get('X-API-Key')
@@ -306,30 +615,311 @@ def get_logs():
         return jsonify({'error': 'Unauthorized'}), 401
     
     count = request.args.get('count', 20, type=int)
-    events = event_logger.get_recent_events(count)
     
-    return jsonify({
+    return conditional_json(logs_etag(count), lambda: {
         'success': True,
-        'events': events
+        'events': event_logger.get_recent_events(count)
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    api_key = request.headers.get('X-API-Key')
+    if not verify_api_key(api_key):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    seconds = request.args.get('seconds', type=float)
+    points = max(1, min(request.args.get('points', 120, type=int), 1000))
+    
+    return jsonify(dict(telemetry.series(seconds, points), success=True))
+
 @app.route('/api/device-info', methods=['GET'])
 def get_device_info():
     api_key = request.headers.get('X-API-Key')
     if not verify_api_key(api_key):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    from lock_manager import LockManager
-    lock_manager = LockManager()
+    return conditional_json(state_etag('device-info'), device_info_payload)
+
+def device_info_payload():
+    lock_state = lock_manager.get_state()
+    return {
+        'success': True,
+        'device_id': device_manager.get_device_id(),
+        'device_info': device_manager.get_device_info(telemetry.latest()),
+        'is_locked': lock_state['is_locked'],
+        'lock_message': lock_state['lock_message']
+    }
+
+def apply_alarm_command(index, command, result, pending_events):
+    action = command['action']
+    if action == 'alarm':
+        duration = command.get('duration', 30)
+        pattern = command.get('pattern', DEFAULT_PATTERN)
+        alarm_system.play_alarm(duration, pattern)
+        result.update(duration=duration, pattern=pattern)
+        pending_events.append((index, "REMOTE_ALARM", f"Alarm triggered via remote batch ({duration}s, {pattern})",
+                               True, True))
+    elif action == 'alarm_stop':
+        result['alarm'] = alarm_system.stop_alarm()
+        pending_events.append((index, "REMOTE_ALARM_STOPPED", "Alarm stopped via remote batch", False, False))
+    else:
+        result['alarm'] = alarm_system.status()
+
+def apply_batch_commands(commands):
+    # The quick commands, applied in order; anything needing a log entry is returned as a pending event
+    results = []
+    pending_events = []
+    for index, command in enumerate(commands):
+        action = command['action']
+        result = {'action': action, 'success': True}
+        results.append(result)
+        
+        if action == 'status':
+            result.update(status_payload())
+        elif action == 'device_info':
+            result.update(device_info_payload())
+        elif action == 'lock':
+            result['success'] = lock_manager.set_lock_status(True, command.get('message') or default_lock_message())
+            if result['success']:
+                pending_events.append((index, "REMOTE_LOCK", "Device locked via remote batch", True, True))
+        elif action == 'unlock':
+            result['success'] = lock_manager.set_lock_status(False, "")
+            if result['success']:
+                pending_events.append((index, "REMOTE_UNLOCK", "Device unlocked via remote batch", False, False))
+        elif action in ('alarm', 'alarm_stop', 'alarm_status'):
+            try:
+                apply_alarm_command(index, command, result, pending_events)
+            except ValueError as e:
+                result.update(success=False, error=str(e))
+        elif action == 'location':
+            result['pending'] = True
+            pending_events.append((index, "REMOTE_LOCATION_CHECK", "Location checked via remote batch", True, False))
+        elif action == 'capture':
+            result['pending'] = True
+            pending_events.append((index, "REMOTE_CAPTURE", "Evidence captured via remote batch", False, True))
+        elif action == 'logs':
+            result['pending'] = True
+    return results, pending_events
+
+def complete_batch(commands, results, pending_events):
+    actions = {command['action'] for command in commands}
+    protected = bool(actions & {'lock', 'alarm'})
+    
+    # The location lookup and the evidence capture are the slow parts; each runs once, side by side
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        location_future = None
+        evidence_future = None
+        if actions & {'lock', 'alarm', 'location'}:
+            location_future = pool.submit(location_tracker.get_current_location)
+        if actions & {'lock', 'alarm', 'capture'}:
+            evidence_future = pool.submit(evidence_capture.capture_evidence_set, 'theft' if protected else 'default')
+        
+        location_data = None
+        evidence_data = None
+        errors = {}
+        try:
+            location_data = location_future.result() if location_future else None
+        except Exception as e:
+            errors['location'] = str(e)
+        try:
+            evidence_data = evidence_future.result() if evidence_future else None
+        except Exception as e:
+            errors['evidence'] = str(e)
+    
+    for index, event_type, description, uses_location, uses_evidence in pending_events:
+        result = results[index]
+        event = event_logger.log_event(event_type, description,
+                                       location=location_data if uses_location else None,
+                                       evidence=evidence_data if uses_evidence else None)
+        result['event_id'] = event['event_id']
+        if result['action'] == 'location':
+            result['location'] = location_data
+            if 'location' in errors:
+                result.update(success=False, error=errors['location'])
+        elif result['action'] == 'capture':
+            result['evidence'] = evidence_data
+            if 'evidence' in errors:
+                result.update(success=False, error=errors['evidence'])
+    if evidence_data:
+        prefetch_thumbnails(4)
+    
+    # Logs are read last so they include the events this batch just recorded
+    for command, result in zip(commands, results):
+        if command['action'] == 'logs':
+            result['events'] = event_logger.get_recent_events(command.get('count', 20))
+        result.pop('pending', None)
+    
+    return {'success': all(result['success'] for result in results), 'results': results}
+
+@app.route('/api/batch', methods=['POST'])
+def run_batch():
+    api_key = request.headers.get('X-API-Key')
+    if not verify_api_key(api_key):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    commands = (request.get_json(silent=True) or {}).get('commands')
+    if not isinstance(commands, list) or not commands:
+        return jsonify({'error': 'Expected a non-empty "commands" list'}), 400
+    if len(commands) > MAX_BATCH_COMMANDS:
+        return jsonify({'error': f'At most {MAX_BATCH_COMMANDS} commands per batch'}), 400
     
+    # Validate everything up front so a bad command never leaves the batch half-applied
+    for index, command in enumerate(commands):
+        action = command.get('action') if isinstance(command, dict) else None
+        if action not in BATCH_ACTIONS:
+            return jsonify({'error': f'Command {index}: unknown action {action!r}', 'actions': list(BATCH_ACTIONS)}), 400
+        if action == 'alarm' and command.get('pattern', DEFAULT_PATTERN) not in PATTERNS:
+            return jsonify({'error': f"Command {index}: unknown alarm pattern {command.get('pattern')!r}"}), 400
+        duration = command.get('duration', 30)
+        if action == 'alarm' and not valid_alarm_duration(duration):
+            return jsonify({'error': f'Command {index}: duration must be from 0.001 to {MAX_ALARM_DURATION} seconds'}), 400
+        if action == 'capture' and command.get('mode', 'photo') != 'photo':
+            return jsonify({'error': f'Command {index}: only photo captures can be batched; use /api/capture for clips'}), 400
+        count = command.get('count', 20)
+        if action == 'logs' and (not isinstance(count, int) or isinstance(count, bool) or count < 0):
+            return jsonify({'error': f'Command {index}: count must be a non-negative integer'}), 400
+    
+    actions = {command['action'] for command in commands}
+    if not actions & SLOW_BATCH_ACTIONS:
+        results, pending_events = apply_batch_commands(commands)
+        return jsonify(complete_batch(commands, results, pending_events))
+    
+    # Location and evidence go through the job queue like /api/lock and /api/capture. The slot is reserved
+    # before any command runs, so a full queue refuses the whole batch instead of half-applying it
+    with job_queue.reserve() as submit:
+        results, pending_events = apply_batch_commands(commands)
+        job = submit('batch', complete_batch, commands, [dict(result) for result in results], pending_events)
+    return job_response(job, {'results': results})
+
+def fleet_device_id():
+    return fleet_registry.authenticate(request.headers.get('X-Device-Key'))
+
+@app.route('/api/fleet/devices', methods=['GET', 'POST'])
+def fleet_devices():
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            device_id, device_key = fleet_registry.enroll(data.get('device_id'), data.get('name'), data.get('metadata'))
+        except DeviceExistsError as e:
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        event_logger.log_event("FLEET_ENROLL", f"Device {device_id} enrolled in fleet")
+        return jsonify({'success': True, 'device_id': device_id, 'device_key': device_key}), 201
+    
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
     return jsonify({
         'success': True,
-        'device_id': device_manager.get_device_id(),
-        'device_info': device_manager.get_device_info(),
-        'is_locked': lock_manager.is_locked(),
-        'lock_message': lock_manager.get_lock_message()
+        'total': fleet_registry.count(),
+        'offset': offset,
+        'devices': fleet_registry.list_devices(offset, limit)
     })
 
+@app.route('/api/fleet/devices/<device_id>', methods=['GET', 'DELETE'])
+def fleet_device(device_id):
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    if request.method == 'DELETE':
+        if not fleet_registry.revoke(device_id):
+            return jsonify({'error': 'Device not found'}), 404
+        event_logger.log_event("FLEET_REVOKE", f"Device {device_id} removed from fleet")
+        return jsonify({'success': True})
+    
+    device = fleet_registry.get(device_id)
+    if not device:
+        return jsonify({'error': 'Device not found'}), 404
+    return jsonify({'success': True, 'device': device, 'status': fleet_registry.get_status(device_id)})
+
+@app.route('/api/fleet/devices/<device_id>/rotate', methods=['POST'])
+def fleet_rotate_key(device_id):
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    device_key = fleet_registry.rotate_key(device_id)
+    if device_key is None:
+        return jsonify({'error': 'Device not found'}), 404
+    event_logger.log_event("FLEET_ROTATE", f"Key rotated for fleet device {device_id}")
+    return jsonify({'success': True, 'device_id': device_id, 'device_key': device_key})
+
+@app.route('/api/fleet/devices/<device_id>/events', methods=['GET'])
+def fleet_device_events(device_id):
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not fleet_registry.get(device_id):
+        return jsonify({'error': 'Device not found'}), 404
+    
+    count = max(1, min(request.args.get('count', 20, type=int), 1000))
+    return jsonify({'success': True, 'events': fleet_registry.recent_events(device_id, count)})
+
+@app.route('/api/fleet/devices/<device_id>/evidence', methods=['GET'])
+def fleet_device_evidence(device_id):
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not fleet_registry.get(device_id):
+        return jsonify({'error': 'Device not found'}), 404
+    
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    total, evidence = fleet_registry.list_evidence(device_id, offset, limit)
+    return jsonify({'success': True, 'total': total, 'offset': offset, 'evidence': evidence})
+
+@app.route('/api/fleet/devices/<device_id>/evidence/<evidence_id>', methods=['GET'])
+def fleet_download_evidence(device_id, evidence_id):
+    if not verify_api_key(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not fleet_registry.get(device_id):
+        return jsonify({'error': 'Device not found'}), 404
+    
+    path = fleet_registry.evidence_path(device_id, evidence_id)
+    if not path:
+        return jsonify({'error': 'Evidence not found'}), 404
+    return send_file(os.path.abspath(path), conditional=True, etag=evidence_id, max_age=0,
+                     as_attachment=request.args.get('download', type=int) == 1,
+                     download_name=os.path.basename(path))
+
+@app.route('/api/fleet/report', methods=['POST'])
+def fleet_report():
+    device_id = fleet_device_id()
+    if not device_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Report must be a JSON object'}), 400
+    events = data.pop('events', None)
+    if events is None:
+        events = []
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        return jsonify({'error': 'events must be a list of objects'}), 400
+    fleet_registry.record_report(device_id, data)
+    if events:
+        fleet_registry.append_events(device_id, events)
+    return jsonify({'success': True, 'device_id': device_id, 'events': len(events)})
+
+@app.route('/api/fleet/evidence', methods=['POST'])
+def fleet_evidence():
+    device_id = fleet_device_id()
+    if not device_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    too_large = {'error': f'Evidence uploads are limited to {FLEET_MAX_EVIDENCE_BYTES} bytes'}
+    if request.content_length is not None and request.content_length > FLEET_MAX_EVIDENCE_BYTES:
+        return jsonify(too_large), 413
+    try:
+        # Also enforced while streaming, for chunked uploads that send no Content-Length
+        record = fleet_registry.store_evidence(device_id, request.stream, request.args.get('filename', ''),
+                                               max_bytes=FLEET_MAX_EVIDENCE_BYTES)
+    except EvidenceTooLargeError:
+        return jsonify(too_large), 413
+    return jsonify(dict(record, success=True)), 201
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -544,6 +1134,7 @@ DASHBOARD_PAGE = '''
         .btn-primary { background: #2196F3; color: white; }
         .btn-warning { background: #ff9800; color: white; }
         .btn-info { background: #00bcd4; color: white; }
+        .control-card select { width: 100%; padding: 10px; margin-bottom: 12px; border: 1px solid #ddd; border-radius: 8px; font-size: 15px; }
         .result-box { margin-top: 15px; padding: 12px; border-radius: 5px; font-size: 14px; display: none; }
         .result-success { background: #e8f5e9; color: #2e7d32; border-left: 4px solid #4CAF50; }
         .result-error { background: #ffebee; color: #c62828; border-left: 4px solid #f44336; }
@@ -554,6 +1145,11 @@ DASHBOARD_PAGE = '''
         .log-time { color: #666; font-size: 12px; }
         .log-type { display: inline-block; padding: 4px 8px; border-radius: 3px; font-size: 11px; font-weight: 600; margin-right: 10px; }
         .log-message { color: #333; }
+        .evidence-container { background: white; padding: 25px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); margin-bottom: 30px; }
+        .evidence-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(160px, 1fr)); gap: 15px; }
+        .evidence-item { text-align: center; font-size: 12px; color: #666; }
+        .evidence-item img { width: 100%; height: 120px; object-fit: cover; border-radius: 5px; background: #eee; }
+        .evidence-placeholder { display: flex; align-items: center; justify-content: center; height: 120px; border-radius: 5px; background: #eee; font-size: 32px; }
     </style>
 </head>
 <body>
@@ -617,6 +1213,13 @@ DASHBOARD_PAGE = '''
             <div class="control-card">
                 <h2>🚨 Trigger Alarm</h2>
                 <p>Sound alarm on the device (30 seconds)</p>
+                <select id="alarmPattern">
+                    <option value="tone">Tone</option>
+                    <option value="siren">Siren</option>
+                    <option value="pulse">Pulse</option>
+                    <option value="two_tone">Two-tone</option>
+                    <option value="chirp">Chirp</option>
+                </select>
                 <button class="btn btn-warning" onclick="triggerAlarm()">Trigger Alarm</button>
                 <div id="alarmResult" class="result-box"></div>
             </div>
@@ -636,6 +1239,11 @@ DASHBOARD_PAGE = '''
             </div>
         </div>
         
+        <div class="evidence-container">
+            <h2 style="margin-bottom: 20px;">🖼️ Recent Evidence</h2>
+            <div id="evidenceContainer" class="evidence-grid">Loading evidence...</div>
+        </div>
+        
         <div class="logs-container">
             <h2 style="margin-bottom: 20px;">📝 Recent Activity Logs</h2>
             <div id="logsContainer">Loading logs...</div>
@@ -661,7 +1269,6 @@ DASHBOARD_PAGE = '''
             .then(data => {
                 if (data.success) {
                     showResult('lockResult', '✓ Device locked successfully!', true);
-                    setTimeout(refreshStatus, 1000);
                 } else {
                     showResult('lockResult', '✗ Failed to lock device', false);
                 }
@@ -675,7 +1282,6 @@ DASHBOARD_PAGE = '''
             .then(data => {
                 if (data.success) {
                     showResult('unlockResult', '✓ Device unlocked successfully!', true);
-                    setTimeout(refreshStatus, 1000);
                 } else {
                     showResult('unlockResult', '✗ Failed to unlock device', false);
                 }
@@ -683,9 +1289,30 @@ DASHBOARD_PAGE = '''
             .catch(() => showResult('unlockResult', '✗ Error unlocking device', false));
         }
         
+        function waitForJob(data) {
+            // Slow actions answer 202 with a job; poll its status_url until the result is in
+            if (!data.job || (data.job.status !== 'queued' && data.job.status !== 'running')) {
+                return Promise.resolve(data);
+            }
+            return fetch(data.status_url + '?wait=10')
+            .then(r => r.json())
+            .then(body => {
+                const job = body.job;
+                if (job && job.status === 'succeeded') {
+                    return Object.assign({success: true}, job.result);
+                }
+                if (job && job.status === 'failed') {
+                    return {success: false, error: job.error};
+                }
+                return waitForJob(Object.assign({}, data, {job: job}));
+            });
+        }
+        
         function getLocation() {
-            fetch('/web/action/location')
+            showResult('locationResult', 'Finding location...', true);
+            fetch('/web/action/location?wait=10')
             .then(r => r.json())
+            .then(waitForJob)
             .then(data => {
                 if (data.success && data.location) {
                     const loc = data.location;
@@ -709,7 +1336,7 @@ DASHBOARD_PAGE = '''
             fetch('/web/action/alarm', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({duration: 30})
+                body: JSON.stringify({duration: 30, pattern: document.getElementById('alarmPattern').value})
             })
             .then(r => r.json())
             .then(data => {
@@ -740,14 +1367,7 @@ DASHBOARD_PAGE = '''
             .then(r => r.json())
             .then(data => {
                 if (data.success) {
-                    const lockStatus = document.getElementById('lockStatus');
-                    if (data.is_locked) {
-                        lockStatus.className = 'status-badge status-locked';
-                        lockStatus.textContent = '🔒 LOCKED';
-                    } else {
-                        lockStatus.className = 'status-badge status-unlocked';
-                        lockStatus.textContent = '🔓 UNLOCKED';
-                    }
+                    showLockStatus(data.is_locked);
                     showResult('refreshResult', '✓ Status updated!', true);
                     loadLogs();
                 } else {
@@ -757,6 +1377,27 @@ DASHBOARD_PAGE = '''
             .catch(() => showResult('refreshResult', '✗ Error refreshing status', false));
         }
         
+        function showLockStatus(isLocked) {
+            const lockStatus = document.getElementById('lockStatus');
+            if (isLocked) {
+                lockStatus.className = 'status-badge status-locked';
+                lockStatus.textContent = '🔒 LOCKED';
+            } else {
+                lockStatus.className = 'status-badge status-unlocked';
+                lockStatus.textContent = '🔓 UNLOCKED';
+            }
+        }
+        
+        function renderLog(event) {
+            return `
+                <div class="log-entry">
+                    <div class="log-time">${event.timestamp || 'N/A'}</div>
+                    <span class="log-type" style="background: #e3f2fd; color: #1976d2;">${event.type || 'EVENT'}</span>
+                    <span class="log-message">${event.description || ''}</span>
+                </div>
+            `;
+        }
+        
         function loadLogs() {
             fetch('/web/action/logs?count=10')
             .then(r => r.json())
@@ -767,13 +1408,7 @@ DASHBOARD_PAGE = '''
                         logsDiv.innerHTML = '<p style="color: #666;">No logs available</p>';
                         return;
                     }
-                    logsDiv.innerHTML = data.events.map(event => `
-                        <div class="log-entry">
-                            <div class="log-time">${event.timestamp || 'N/A'}</div>
-                            <span class="log-type" style="background: #e3f2fd; color: #1976d2;">${event.event_type || 'EVENT'}</span>
-                            <span class="log-message">${event.description || ''}</span>
-                        </div>
-                    `).join('');
+                    logsDiv.innerHTML = data.events.map(renderLog).join('');
                 }
             })
             .catch(() => {
@@ -781,13 +1416,103 @@ DASHBOARD_PAGE = '''
             });
         }
         
+        function loadEvidence() {
+            fetch('/api/evidence?limit=12')
+            .then(r => r.json())
+            .then(data => {
+                const evidenceDiv = document.getElementById('evidenceContainer');
+                if (!data.success || data.evidence.length === 0) {
+                    evidenceDiv.innerHTML = '<p style="color: #666;">No evidence captured yet</p>';
+                    return;
+                }
+                evidenceDiv.innerHTML = data.evidence.map(item => `
+                    <div class="evidence-item">
+                        <a href="${item.download_url}" target="_blank">
+                            ${item.thumb_url
+                                ? `<img src="${item.thumb_url}" alt="${item.kind}" loading="lazy">`
+                                : `<div class="evidence-placeholder">${item.kind === 'clip' ? '🎬' : '📄'}</div>`}
+                        </a>
+                        <div>${item.kind} · ${(item.size / 1024).toFixed(1)} KB</div>
+                        <div>${(item.created || '').substring(0, 19)}</div>
+                    </div>
+                `).join('');
+            })
+            .catch(() => {
+                document.getElementById('evidenceContainer').innerHTML = '<p style="color: #f44336;">Error loading evidence</p>';
+            });
+        }
+        
+        function appendLog(event) {
+            const logsDiv = document.getElementById('logsContainer');
+            if (!logsDiv.querySelector('.log-entry')) {
+                logsDiv.innerHTML = '';
+            }
+            logsDiv.insertAdjacentHTML('beforeend', renderLog(event));
+            const entries = logsDiv.querySelectorAll('.log-entry');
+            for (let i = 0; i < entries.length - 10; i++) {
+                entries[i].remove();
+            }
+        }
+        
         loadLogs();
-        setInterval(loadLogs, 30000);
+        loadEvidence();
+        
+        if (window.EventSource) {
+            // The browser reconnects on its own and resumes from the last event it saw
+            const stream = new EventSource('/api/stream');
+            stream.addEventListener('log', e => {
+                const event = JSON.parse(e.data);
+                appendLog(event);
+                if (event.evidence) {
+                    loadEvidence();
+                }
+            });
+            stream.addEventListener('lock', e => showLockStatus(JSON.parse(e.data).is_locked));
+            stream.addEventListener('job', e => {
+                const job = JSON.parse(e.data);
+                if (job.status === 'failed') {
+                    showResult(job.type + 'Result', '✗ ' + job.type + ' failed: ' + (job.error || 'unknown error'), false);
+                }
+            });
+            stream.addEventListener('reset', () => {
+                loadLogs();
+                loadEvidence();
+                refreshStatus();
+            });
+        } else {
+            setInterval(loadLogs, 30000);
+            setInterval(loadEvidence, 30000);
+        }
     </script>
 </body>
 </html>
 '''
 
+prefetch_thumbnails(reconcile=True)
+event_logger.upload_queue.start()
+atexit.register(event_logger.upload_queue.stop)
+atexit.register(alarm_system.shutdown)
+atexit.register(thumbnail_cache.shutdown)
+# Stream ids are built from the event log id and the lock version, which every worker reads from disk;
+# job messages are live-only, since a job's result also lands in the event log
+event_broker.add_source('log', lambda event: event.get('event_id') or 0,
+                        lambda: event_logger.get_last_event_id() or 0,
+                        lambda after: [event for event in event_logger.load_events()
+                                       if (event.get('event_id') or 0) > after])
+event_broker.add_source('lock', lambda state: state['version'], lock_manager.get_version, replay_lock)
+lock_manager.subscribe(lambda state: event_broker.publish('lock', lock_stream_payload(state)))
+event_logger.subscribe(lambda event: event_broker.publish('log', event))
+job_queue.subscribe(lambda job: event_broker.publish('job', job))
+event_broker.add_poller(lock_manager.refresh)
+event_broker.add_poller(event_logger.refresh)
+event_broker.start()
+atexit.register(event_broker.close)
+job_queue.start()
+# atexit runs handlers in reverse order: queued jobs drain before the broker, alarm and upload queue stop
+atexit.register(job_queue.shutdown)
+telemetry.start()
+atexit.register(telemetry.stop)
+
 if __name__ == '__main__':
     api_creds = api_auth.get_api_credentials()
     
@@ -808,9 +1533,19 @@ if __name__ == '__main__':
         print("  POST /api/unlock        - Unlock device")
         print("  GET  /api/location      - Get current location")
         print("  POST /api/alarm         - Trigger alarm")
-        print("  POST /api/capture       - Capture evidence")
+        print("  POST /api/alarm/stop    - Stop alarm")
+        print("  GET  /api/alarm/status  - Get alarm status")
+        print("  POST /api/capture       - Capture evidence (mode=clip for video)")
+        print("  GET  /api/jobs/<id>     - Get status of a queued job")
+        print("  GET  /api/stream        - Live events, lock changes and job results (SSE)")
+        print("  POST /api/batch         - Run several commands in one request")
         print("  GET  /api/logs          - Get event logs")
         print("  GET  /api/device-info   - Get device information")
+        print("  GET  /api/metrics       - Get CPU/memory/disk/battery/network history")
+        print("  GET  /api/fleet/devices - List enrolled fleet devices (POST to enroll)")
+        print("  GET  /api/evidence      - List captured evidence")
+        print("  GET  /api/evidence/<id> - Download evidence file (supports Range)")
+        print("  GET  /api/evidence/<id>/thumb - Get evidence preview image")
         print("\nUse header: X-API-Key: YOUR_API_KEY")
     
     print("\nServer listening on http://0.0.0.0:5000")
@@ -0,0 +1,158 @@
+import hashlib
+import io
+import threading
+import cv2
+import numpy as np
+
+class ScreenDeltaRecorder:
+    def __init__(self, store, tile_size=64, keyframe_interval=30):
+        self.store = store
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.lock = threading.Lock()
+        self.tile_hashes = None
+        self.shape = None
+        self.last_frame_id = None
+        self.keyframe_id = None
+        self.frames_since_keyframe = 0
+
+    def _pad(self, image):
+        height, width = image.shape[:2]
+        pad_y = -height % self.tile_size
+        pad_x = -width % self.tile_size
+        if pad_y or pad_x:
+            image = np.pad(image, ((0, pad_y), (0, pad_x), (0, 0)), mode='edge')
+        return image
+
+    def _tiles(self, image):
+        # (rows, cols, tile, tile, channels) view over the padded frame without copying
+        padded = self._pad(image)
+        rows = padded.shape[0] // self.tile_size
+        cols = padded.shape[1] // self.tile_size
+        return padded.reshape(rows, self.tile_size, cols, self.tile_size, -1).swapaxes(1, 2)
+
+    def _hash_tiles(self, tiles):
+        rows, cols = tiles.shape[:2]
+        return [hashlib.blake2b(np.ascontiguousarray(tiles[r, c]).tobytes(), digest_size=8).digest()
+                for r in range(rows) for c in range(cols)]
+
+    def _store_keyframe(self, image):
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+        if not ok:
+            raise ValueError("PNG encoding failed")
+        record = self.store.put_bytes(encoded.tobytes(), '.png', 'screen_keyframe', meta={
+            'tile_size': self.tile_size,
+            'shape': list(image.shape)
+        })
+        self.keyframe_id = record['id']
+        self.frames_since_keyframe = 0
+        return record
+
+    def _store_delta(self, tiles, changed):
+        cols = tiles.shape[1]
+        indices = np.array(changed, dtype=np.int32)
+        changed_tiles = np.stack([tiles[i // cols, i % cols] for i in changed])
+        buffer = io.BytesIO()
+        # The parent id is part of the payload: two identical tile changes at different points in the chain
+        # must not be deduplicated into one blob, or the chain would jump back to the older one
+        np.savez_compressed(buffer, indices=indices, tiles=changed_tiles, parent=np.array(self.last_frame_id))
+        self.frames_since_keyframe += 1
+        return self.store.put_bytes(buffer.getvalue(), '.npz', 'screen_delta', meta={
+            'parent': self.last_frame_id,
+            'keyframe': self.keyframe_id,
+            'tile_size': self.tile_size,
+            'shape': list(self.shape),
+            'changed_tiles': len(changed),
+            'total_tiles': len(self.tile_hashes)
+        })
+
+    def record(self, image):
+        with self.lock:
+            tiles = self._tiles(image)
+            tile_hashes = self._hash_tiles(tiles)
+
+            if (self.tile_hashes is None or image.shape != self.shape
+                    or self.frames_since_keyframe >= self.keyframe_interval
+                    or not chain_intact(self.store, self.last_frame_id)):
+                self.shape = image.shape
+                record = self._store_keyframe(image)
+            else:
+                changed = [i for i, (old, new) in enumerate(zip(self.tile_hashes, tile_hashes)) if old != new]
+                if not changed:
+                    return self.store.get(self.last_frame_id)
+                record = self._store_delta(tiles, changed)
+
+            self.tile_hashes = tile_hashes
+            self.last_frame_id = record['id']
+            return record
+
+
+def chain_intact(store, frame_id):
+    record = store.get(frame_id)
+    while record is not None and record['kind'] == 'screen_delta':
+        record = store.get(record['meta']['parent'])
+    return record is not None and record['kind'] == 'screen_keyframe'
+
+def reconstruct_frame(store, frame_id):
+    chain = []
+    record = store.get(frame_id)
+    while record is not None and record['kind'] == 'screen_delta':
+        chain.append(record)
+        record = store.get(record['meta']['parent'])
+    if record is None or record['kind'] != 'screen_keyframe':
+        raise ValueError(f"Cannot reconstruct {frame_id}: part of its delta chain is missing")
+
+    frame = cv2.imdecode(np.frombuffer(store.read_bytes(record), np.uint8), cv2.IMREAD_UNCHANGED)
+    tile_size = record['meta']['tile_size']
+    height, width = frame.shape[:2]
+    if frame.ndim == 2:
+        frame = frame[..., np.newaxis]
+    canvas = np.pad(frame, ((0, -height % tile_size), (0, -width % tile_size), (0, 0)), mode='edge')
+    cols = canvas.shape[1] // tile_size
+
+    for delta in reversed(chain):
+        with np.load(io.BytesIO(store.read_bytes(delta))) as data:
+            for index, tile in zip(data['indices'], data['tiles']):
+                row, col = divmod(int(index), cols)
+                canvas[row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size] = tile
+
+    return canvas[:height, :width].squeeze()
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import tempfile
+    from evidence_store import EvidenceStore
+
+    parser = argparse.ArgumentParser(description="Rebuild a screenshot from tile-delta evidence")
+    parser.add_argument('frame_id', nargs='?', help="Evidence id of a screen_keyframe or screen_delta")
+    parser.add_argument('-o', '--output', help="Output image path (defaults to <frame_id>.png)")
+    parser.add_argument('--evidence-dir', default="data/evidence")
+    parser.add_argument('--simulate', type=int, metavar='FRAMES',
+                        help="Record a synthetic desktop session and compare bytes against full screenshots")
+    args = parser.parse_args()
+
+    if args.simulate:
+        from encoding_policy import synthetic_screen
+
+        store = EvidenceStore(tempfile.mkdtemp(), max_bytes=1 << 40, max_files=1 << 20)
+        recorder = ScreenDeltaRecorder(store)
+        screen = synthetic_screen()
+        full_bytes = 0
+        frame_ids = []
+        for i in range(args.simulate):
+            screen[80:120, 100:100 + 20 * (i % 40)] = (i * 7) % 256
+            full_bytes += len(cv2.imencode('.png', screen, [cv2.IMWRITE_PNG_COMPRESSION, 3])[1])
+            frame_ids.append(recorder.record(screen.copy())['id'])
+        delta_bytes = store.usage()['bytes']
+        assert np.array_equal(reconstruct_frame(store, frame_ids[-1]), screen)
+        print(f"Full screenshots: {full_bytes / 1024:.1f} KB")
+        print(f"Tile deltas:      {delta_bytes / 1024:.1f} KB ({full_bytes / max(delta_bytes, 1):.1f}x smaller)")
+    elif args.frame_id:
+        store = EvidenceStore(args.evidence_dir)
+        output = args.output or f"{args.frame_id}.png"
+        cv2.imwrite(output, reconstruct_frame(store, args.frame_id))
+        print(f"Reconstructed frame written to {os.path.abspath(output)}")
+    else:
+        parser.print_help()
@@ -0,0 +1,221 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+import psutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+METRICS = ('cpu_percent', 'memory_percent', 'disk_percent', 'battery_percent', 'battery_plugged',
+           'net_sent_bps', 'net_recv_bps')
+
+class TelemetrySampler:
+    def __init__(self, interval=5.0, capacity=720, disk_path='/', shared_file=None):
+        self.interval = interval
+        self.capacity = capacity
+        self.disk_path = disk_path
+        # With a shared_file, one process (the flock owner) samples psutil and every other process
+        # reads the same ring buffer through mmap, so all server workers report identical history
+        self.shared_file = shared_file
+        self.owner_handle = None
+        self.header = None
+        self.table = None
+        if shared_file is None:
+            self.header = np.zeros(1, dtype=np.int64)
+            self.table = np.full((len(METRICS) + 1, capacity), np.nan)
+        self.last_net = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _file_size(self):
+        # An int64 sample counter, then one row of doubles for timestamps and one per metric;
+        # missing readings (no battery) are NaN
+        return 8 + 8 * self.capacity * (len(METRICS) + 1)
+
+    def _map(self, create=False):
+        if self.table is not None:
+            return True
+        try:
+            if create:
+                with open(self.shared_file, 'a+b') as f:
+                    if os.fstat(f.fileno()).st_size != self._file_size():
+                        f.truncate(0)
+                        f.truncate(self._file_size())
+            elif os.path.getsize(self.shared_file) != self._file_size():
+                return False
+            self.header = np.memmap(self.shared_file, dtype=np.int64, mode='r+', shape=(1,))
+            self.table = np.memmap(self.shared_file, dtype=np.float64, mode='r+', offset=8,
+                                   shape=(len(METRICS) + 1, self.capacity))
+            return True
+        except (OSError, ValueError):
+            return False
+
+    @property
+    def is_owner(self):
+        return self.shared_file is None or self.owner_handle is not None
+
+    def _acquire_owner(self):
+        if self.is_owner:
+            return True
+        if fcntl is None:
+            self.owner_handle = True
+        else:
+            handle = open(self.shared_file + ".lock", 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            self.owner_handle = handle
+        self._map(create=True)
+        # The first cpu_percent call only sets a baseline
+        psutil.cpu_percent(interval=None)
+        return True
+
+    def _release_owner(self):
+        if self.owner_handle not in (None, True):
+            self.owner_handle.close()
+        self.owner_handle = None
+
+    @property
+    def count(self):
+        with self.lock:
+            return int(self.header[0]) if self._map() else 0
+
+    def read(self):
+        now = time.time()
+        net = psutil.net_io_counters()
+        sample = {
+            'timestamp': now,
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': psutil.virtual_memory().percent,
+            'disk_percent': psutil.disk_usage(self.disk_path).percent,
+            'battery_percent': math.nan,
+            'battery_plugged': math.nan,
+            'net_sent_bps': math.nan,
+            'net_recv_bps': math.nan
+        }
+        battery = psutil.sensors_battery() if hasattr(psutil, 'sensors_battery') else None
+        if battery is not None:
+            sample['battery_percent'] = battery.percent
+            sample['battery_plugged'] = 1.0 if battery.power_plugged else 0.0
+        if net is not None:
+            if self.last_net is not None:
+                elapsed = now - self.last_net[0]
+                if elapsed > 0:
+                    sample['net_sent_bps'] = max(0, net.bytes_sent - self.last_net[1]) / elapsed
+                    sample['net_recv_bps'] = max(0, net.bytes_recv - self.last_net[2]) / elapsed
+            self.last_net = (now, net.bytes_sent, net.bytes_recv)
+        return sample
+
+    def record(self, sample):
+        with self.lock:
+            if not self._map(create=True):
+                return
+            count = int(self.header[0])
+            index = count % self.capacity
+            self.table[:, index] = [sample['timestamp']] + [sample[name] for name in METRICS]
+            # The counter moves last, so readers never see a slot before it is filled
+            self.header[0] = count + 1
+
+    def sample_once(self):
+        try:
+            self.record(self.read())
+        except Exception as e:
+            print(f"Telemetry error: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            # Retried every tick, so another worker takes over when the owner exits
+            if self._acquire_owner():
+                self.sample_once()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        if self._acquire_owner():
+            self.sample_once()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(self.interval + 1)
+            self.thread = None
+        self._release_owner()
+
+    def latest(self):
+        # Served straight from memory; status requests never touch psutil
+        with self.lock:
+            if not self._map() or self.header[0] == 0:
+                return None
+            count = int(self.header[0])
+            column = self.table[:, (count - 1) % self.capacity]
+            sample = dict(zip(('timestamp',) + METRICS, column.tolist()), sample=count)
+        return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in sample.items()}
+
+    def _ordered(self):
+        with self.lock:
+            if not self._map():
+                return np.empty(0), {name: np.empty(0) for name in METRICS}
+            count = int(self.header[0])
+            stored = min(count, self.capacity)
+            start = count % self.capacity if count > self.capacity else 0
+            order = np.roll(np.arange(self.capacity), -start)[:stored]
+            rows = np.asarray(self.table)[:, order]
+        return rows[0], {name: rows[i + 1] for i, name in enumerate(METRICS)}
+
+    def series(self, seconds=None, points=120):
+        timestamps, values = self._ordered()
+        if seconds:
+            keep = timestamps >= time.time() - seconds
+            timestamps = timestamps[keep]
+            values = {name: column[keep] for name, column in values.items()}
+
+        if points and len(timestamps) > points:
+            # Average equal-sized buckets; each bucket is stamped with its last sample time
+            buckets = np.array_split(np.arange(len(timestamps)), points)
+            ends = [bucket[-1] for bucket in buckets]
+            timestamps = timestamps[ends]
+            with np.errstate(all='ignore'):
+                values = {name: np.array([np.nanmean(column[b]) if not np.isnan(column[b]).all() else np.nan
+                                          for b in buckets])
+                          for name, column in values.items()}
+
+        return {
+            'interval': self.interval,
+            'sample': self.count,
+            'timestamps': [round(float(t), 1) for t in timestamps],
+            'series': {name: [None if np.isnan(v) else round(float(v), 1) for v in column]
+                       for name, column in values.items()}
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Sample system telemetry and print a downsampled series")
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--points', type=int, default=5)
+    args = parser.parse_args()
+
+    sampler = TelemetrySampler(interval=args.interval)
+    sampler.start()
+    time.sleep(args.interval * args.samples + 0.1)
+    sampler.stop()
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        sampler.latest()
+    print(f"latest(): {(time.perf_counter() - start) * 1000:.1f} us per call")
+    print(json.dumps(sampler.series(points=args.points), indent=2))
@@ -0,0 +1,120 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from evidence_crypto import encrypt_stream, open_evidence
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+
+def render_thumbnail(source_path, thumb_path, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY, key=None):
+    from PIL import Image
+
+    # Thumbnails of encrypted evidence are encrypted with the same key
+    output = io.BytesIO()
+    with open_evidence(source_path, key) as source, Image.open(source) as image:
+        image.draft('RGB', size)
+        image.thumbnail(size)
+        image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True)
+
+    # Unique temp name: several server workers may render the same thumbnail at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(thumb_path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if key:
+                encrypt_stream([output.getvalue()], f, key)
+            else:
+                f.write(output.getvalue())
+        os.replace(tmp_path, thumb_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return thumb_path
+
+class ThumbnailCache:
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+    def __init__(self, thumb_dir="data/evidence/thumbs", workers=2, key=None):
+        self.thumb_dir = thumb_dir
+        self.key = key
+        self.workers = workers
+        self.executor = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ensure_thumb_directory()
+
+    def ensure_thumb_directory(self):
+        if not os.path.exists(self.thumb_dir):
+            os.makedirs(self.thumb_dir)
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def cache_key(self, record):
+        # Content-addressed blobs are immutable, so the blob id identifies the source exactly;
+        # files adopted by reconcile keep their name, so fold in size and mtime as well
+        stat = os.stat(record['path'])
+        return f"{record['id']}_{stat.st_size}_{stat.st_mtime_ns}"
+
+    def thumb_path(self, record):
+        return os.path.join(self.thumb_dir, f"{self.cache_key(record)}.jpg")
+
+    def is_supported(self, record):
+        return record.get('ext', os.path.splitext(record['path'])[1]).lower() in self.IMAGE_EXTENSIONS
+
+    def submit(self, record):
+        if not self.is_supported(record):
+            return None
+        thumb_path = self.thumb_path(record)
+        if os.path.exists(thumb_path):
+            return None
+
+        with self.lock:
+            future = self.pending.get(thumb_path)
+            if future is not None:
+                return future
+            key = self.key if record.get('encrypted') else None
+            future = self.get_executor().submit(render_thumbnail, record['path'], thumb_path, key=key)
+            self.pending[thumb_path] = future
+        # Registered outside the lock: an already-finished future runs the callback right here
+        future.add_done_callback(lambda f: self._finished(thumb_path))
+        return future
+
+    def _finished(self, thumb_path):
+        with self.lock:
+            future = self.pending.pop(thumb_path, None)
+        if future is not None and future.exception():
+            print(f"Thumbnail error: {future.exception()}")
+
+    def get_thumbnail(self, record, timeout=10):
+        try:
+            thumb_path = self.thumb_path(record)
+        except OSError:
+            return None
+        if os.path.exists(thumb_path):
+            return thumb_path
+
+        future = self.submit(record)
+        if future is None:
+            return thumb_path if os.path.exists(thumb_path) else None
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            return None
+        return thumb_path
+
+    def prefetch(self, records):
+        for record in records:
+            try:
+                self.submit(record)
+            except OSError:
+                continue
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
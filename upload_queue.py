@@ -0,0 +1,337 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount or self.tokens >= self.capacity:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+class UploadQueue:
+    def __init__(self, endpoint=None, api_key=None, journal_file="data/upload_queue.jsonl",
+                 chunk_size=256 * 1024, max_concurrency=2, max_bytes_per_second=None,
+                 evidence_store=None, device_id=None):
+        self.endpoint = (endpoint or os.environ.get('COLLECTION_URL', '')).rstrip('/')
+        self.api_key = api_key or os.environ.get('COLLECTION_API_KEY', '')
+        self.journal_file = journal_file
+        self.lock_file = journal_file + ".lock"
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        rate = max_bytes_per_second or int(os.environ.get('UPLOAD_MAX_BYTES_PER_SECOND', 0))
+        self.bandwidth = TokenBucket(rate, max(rate, chunk_size)) if rate else None
+        self.evidence_store = evidence_store
+        self.device_id = device_id
+        self.lock = threading.RLock()
+        self.items = {}
+        self.journal_offset = 0
+        self.journal_inode = None
+        self.retry_state = {}
+        self.in_flight = set()
+        self.owner_handle = None
+        self.worker = None
+        self.executor = None
+        self.stop_event = threading.Event()
+        self.stats = {'uploaded_items': 0, 'uploaded_bytes': 0, 'failures': 0}
+
+    def is_enabled(self):
+        return bool(self.endpoint)
+
+    def refresh(self):
+        # Same append-only journal pattern as the evidence manifest: any process can enqueue
+        with self.lock:
+            try:
+                stat = os.stat(self.journal_file)
+            except OSError:
+                return
+            if stat.st_ino != self.journal_inode:
+                # First read, or the owner compacted the journal: the new file lists every pending item
+                self.journal_inode = stat.st_ino
+                self.journal_offset = 0
+                self.items = {}
+            if stat.st_size <= self.journal_offset:
+                return
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self.journal_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self.journal_offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('op') == 'enqueue':
+                        self.items.setdefault(entry['id'], entry)
+                    elif entry.get('op') == 'done':
+                        self.items.pop(entry['id'], None)
+                    elif entry.get('op') == 'priority' and entry['id'] in self.items:
+                        self.items[entry['id']]['priority'] = entry['priority']
+
+    @contextmanager
+    def _journal_lock(self):
+        # Appends and compaction exclude each other across processes, so no entry lands in a replaced file
+        directory = os.path.dirname(self.journal_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.journal_file + ".writer.lock", 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def append(self, entry):
+        with self._journal_lock():
+            with open(self.journal_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        self.refresh()
+
+    def compact(self):
+        # Rewrites the journal with only the pending items; done items and priority changes are folded in
+        with self.lock, self._journal_lock():
+            self.refresh()
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.journal_file) or '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    for item in self.items.values():
+                        f.write(json.dumps(item) + '\n')
+                os.replace(tmp_path, self.journal_file)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self.refresh()
+
+    def enqueue_event(self, event):
+        if not self.is_enabled():
+            return None
+        item_id = f"event:{event.get('event_id')}:{event.get('timestamp')}"
+        with self.lock:
+            self.append({
+                'op': 'enqueue',
+                'id': item_id,
+                'type': 'event',
+                'event': event,
+                'priority': 10,
+                'created': datetime.now().isoformat()
+            })
+        return item_id
+
+    def enqueue_evidence(self, record, priority=None):
+        if not self.is_enabled() or not record:
+            return None
+        item_id = f"evidence:{record['id']}"
+        with self.lock:
+            self.refresh()
+            if item_id not in self.items:
+                self.append({
+                    'op': 'enqueue',
+                    'id': item_id,
+                    'type': 'evidence',
+                    'blob_id': record['id'],
+                    'priority': record.get('priority', 0) if priority is None else priority,
+                    'created': datetime.now().isoformat()
+                })
+        return item_id
+
+    def prioritize(self, record, priority):
+        if not self.is_enabled() or not record:
+            return None
+        item_id = f"evidence:{record['id']}"
+        with self.lock:
+            self.refresh()
+            if item_id not in self.items:
+                return self.enqueue_evidence(record, priority)
+            if self.items[item_id].get('priority', 0) < priority:
+                self.append({'op': 'priority', 'id': item_id, 'priority': priority})
+        return item_id
+
+    def pending(self):
+        with self.lock:
+            self.refresh()
+            return len(self.items)
+
+    def status(self):
+        with self.lock:
+            return dict(self.stats, pending=self.pending(), in_flight=len(self.in_flight),
+                        enabled=self.is_enabled(), owner=self.owner_handle is not None)
+
+    def _headers(self):
+        return {'X-API-Key': self.api_key}
+
+    def _device_id(self):
+        if self.device_id is None:
+            from device_manager import DeviceManager
+            self.device_id = DeviceManager().get_device_id()
+        return self.device_id
+
+    def _acquire_owner(self):
+        # Only one process (e.g. one gunicorn worker) drains the queue at a time
+        if self.owner_handle is not None:
+            return True
+        if fcntl is None:
+            self.owner_handle = True
+            return True
+        handle = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.owner_handle = handle
+        return True
+
+    def start(self, poll_interval=2.0):
+        if not self.is_enabled() or self.worker is not None:
+            return
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self.worker = threading.Thread(target=self._run, args=(poll_interval,))
+        self.worker.daemon = True
+        self.worker.start()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout)
+            self.worker = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def _due_items(self):
+        now = time.time()
+        with self.lock:
+            self.refresh()
+            due = [item for item_id, item in self.items.items()
+                   if item_id not in self.in_flight
+                   and self.retry_state.get(item_id, (0, 0))[1] <= now]
+        due.sort(key=lambda item: (-item.get('priority', 0), item.get('created', '')))
+        return due
+
+    def _run(self, poll_interval):
+        while not self.stop_event.is_set():
+            if self._acquire_owner():
+                for item in self._due_items():
+                    with self.lock:
+                        if len(self.in_flight) >= self.max_concurrency:
+                            break
+                        self.in_flight.add(item['id'])
+                    self.executor.submit(self._process, item)
+                with self.lock:
+                    drained = not self.items and not self.in_flight and self.journal_offset > 0
+                if drained:
+                    try:
+                        self.compact()
+                    except OSError as e:
+                        print(f"Upload journal compaction error: {e}")
+            self.stop_event.wait(poll_interval)
+
+    def _process(self, item):
+        try:
+            if item['type'] == 'event':
+                self._upload_event(item['event'])
+            else:
+                self._upload_evidence(item['blob_id'])
+            with self.lock:
+                self.append({'op': 'done', 'id': item['id']})
+                self.retry_state.pop(item['id'], None)
+                self.stats['uploaded_items'] += 1
+        except Exception as e:
+            with self.lock:
+                attempts = self.retry_state.get(item['id'], (0, 0))[0] + 1
+                delay = min(600, 2 ** attempts) * random.uniform(0.5, 1.5)
+                self.retry_state[item['id']] = (attempts, time.time() + delay)
+                self.stats['failures'] += 1
+            print(f"Upload error ({item['id']}, attempt {attempts}, retry in {delay:.0f}s): {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(item['id'])
+
+    def _upload_event(self, event):
+        response = requests.post(f"{self.endpoint}/events", headers=self._headers(), timeout=15,
+                                 json={'device_id': self._device_id(), 'event': event})
+        response.raise_for_status()
+
+    def _upload_evidence(self, blob_id):
+        record = self.evidence_store.get(blob_id) if self.evidence_store else None
+        if not record or not os.path.exists(record['path']):
+            # Evicted or deleted before it could be sent; nothing left to upload
+            return
+
+        with self.evidence_store.open_blob(record) as f:
+            self._send_blob(blob_id, record, f)
+
+    def _start_upload(self, blob_id, record, size):
+        # Idempotent: reports how much the server already has, and whether the finished file verified
+        response = requests.post(f"{self.endpoint}/uploads", headers=self._headers(), timeout=15, json={
+            'upload_id': blob_id,
+            'device_id': self._device_id(),
+            'kind': record['kind'],
+            'filename': record['filename'],
+            'size': size,
+            'sha256': blob_id
+        })
+        response.raise_for_status()
+        return response.json()
+
+    def _send_blob(self, blob_id, record, f):
+        # Encrypted blobs are decrypted chunk by chunk; the collection server verifies the plaintext hash
+        size = f.seek(0, os.SEEK_END)
+        state = self._start_upload(blob_id, record, size)
+        offset = state.get('offset', 0)
+        verified = state.get('verified', False)
+
+        # A zero-byte blob still needs one (empty) chunk so the server creates and verifies the file
+        while not verified and (offset < size or size == 0):
+            if self.stop_event.is_set():
+                raise RuntimeError("Upload queue stopping")
+            f.seek(offset)
+            chunk = f.read(self.chunk_size)
+            if self.bandwidth:
+                self.bandwidth.consume(len(chunk))
+            response = requests.patch(f"{self.endpoint}/uploads/{blob_id}", data=chunk, timeout=30,
+                                      headers=dict(self._headers(), **{'Upload-Offset': str(offset)}))
+            if response.status_code == 409:
+                # Someone else moved the upload on (or finished it); ask where it stands now
+                state = self._start_upload(blob_id, record, size)
+                offset = state.get('offset', 0)
+                verified = state.get('verified', False)
+                if offset >= size and not verified:
+                    break
+                continue
+            response.raise_for_status()
+            offset = response.json()['offset']
+            verified = response.json().get('verified', False)
+            with self.lock:
+                self.stats['uploaded_bytes'] += len(chunk)
+            if offset >= size:
+                break
+
+        if not verified:
+            raise RuntimeError("Collection server did not verify the upload checksum")